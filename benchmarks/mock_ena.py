@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the ENA endpoints used by EnaDataSource.
+
+Serves checklists, host and drop-box sample XML, taxonomy lookups,
+drop-box ADD receipts and MODIFY receipts, with configurable latency and error injection, and
+counts every request it handles. Point the credentials "uri" at it:
+
+    python benchmarks/mock_ena.py --port 8080 --latency 0.05 --error-rate 0.01
+"""
+
+import argparse
+import collections
+import email.parser
+import email.policy
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.parse
+import xml.etree.ElementTree as ElementTree
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+# Fields served for every checklist. Only a few are constrained, so that
+# generated inputs validate while the validators still do real work.
+CHECKLIST_FIELDS = [
+    ("collection date", "mandatory", ("regex", r"[12][0-9]{3}(-[0-9]{2}(-[0-9]{2})?)?|not collected")),
+    ("geographic location (country and/or sea)", "mandatory", None),
+    ("geographic location (latitude)", "mandatory", None),
+    ("geographic location (longitude)", "mandatory", None),
+    ("host scientific name", "mandatory", None),
+    ("host taxid", "optional", None),
+    ("host sex", "optional", ("choice", ["female", "male", "hermaphrodite", "other", "not collected"])),
+    ("host life stage", "optional", None),
+    ("broad-scale environmental context", "mandatory", None),
+    ("local environmental context", "mandatory", None),
+    ("environmental medium", "mandatory", None),
+    ("sample derived from", "mandatory", None),
+    ("tolid", "optional", None),
+    ("16S recovered", "optional", ("choice", ["Yes", "No"])),
+    ("assembly quality", "optional", None),
+    ("completeness score", "optional", None),
+    ("contamination score", "optional", None),
+]
+
+HOST_ATTRIBUTES = {
+    "collection date": "2021-06-01",
+    "geographic location (country and/or sea)": "United Kingdom",
+    "geographic location (latitude)": "51.5230",
+    "geographic location (longitude)": "-0.1580",
+    "sex": "FEMALE",
+    "lifestage": "adult",
+    "collected_by": "A COLLECTOR",
+    "tolid": "mVulVul1",
+    "ENA-CHECKLIST": "ERC000053",
+}
+
+
+def checklist_xml(checklist_id):
+    fields = []
+    for label, mandatory, constraint in CHECKLIST_FIELDS:
+        if constraint is None:
+            field_type = "<TEXT_FIELD/>"
+        elif constraint[0] == "regex":
+            field_type = f"<TEXT_FIELD><REGEX_VALUE>{escape(constraint[1])}</REGEX_VALUE></TEXT_FIELD>"
+        else:
+            values = "".join(
+                f"<TEXT_VALUE><VALUE>{escape(value)}</VALUE></TEXT_VALUE>"
+                for value in constraint[1]
+            )
+            field_type = f"<TEXT_CHOICE_FIELD>{values}</TEXT_CHOICE_FIELD>"
+
+        fields.append(
+            f"<FIELD><LABEL>{escape(label)}</LABEL><MANDATORY>{mandatory}</MANDATORY>"
+            f"<FIELD_TYPE>{field_type}</FIELD_TYPE></FIELD>"
+        )
+
+    return (
+        f'<CHECKLIST_SET><CHECKLIST accession="{checklist_id}"><DESCRIPTOR>'
+        f"<FIELD_GROUP>{''.join(fields)}</FIELD_GROUP>"
+        "</DESCRIPTOR></CHECKLIST></CHECKLIST_SET>"
+    )
+
+
+def sample_xml(accession, attributes, title="host sample"):
+    attribute_xml = "".join(
+        f"<SAMPLE_ATTRIBUTE><TAG>{escape(tag)}</TAG><VALUE>{escape(value)}</VALUE></SAMPLE_ATTRIBUTE>"
+        for tag, value in attributes.items()
+    )
+
+    return (
+        f'<SAMPLE_SET><SAMPLE accession="ERS{accession[5:]}" alias="{accession}">'
+        f'<IDENTIFIERS><EXTERNAL_ID namespace="BioSample">{accession}</EXTERNAL_ID></IDENTIFIERS>'
+        f"<TITLE>{escape(title)}</TITLE>"
+        "<SAMPLE_NAME><TAXON_ID>9627</TAXON_ID><SCIENTIFIC_NAME>Vulpes vulpes</SCIENTIFIC_NAME></SAMPLE_NAME>"
+        f"<SAMPLE_ATTRIBUTES>{attribute_xml}</SAMPLE_ATTRIBUTES>"
+        "</SAMPLE></SAMPLE_SET>"
+    )
+
+
+class MockEna:
+    """State shared by the request handlers: counters, stored records, faults."""
+
+    def __init__(self, latency=0.0, error_rate=0.0, reject_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.reject_rate = reject_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = collections.Counter()
+        self.records = {}
+        self.next_accession = 0
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests.clear()
+
+    def count(self, endpoint):
+        with self.lock:
+            self.requests[endpoint] += 1
+            return self.random.random()
+
+    def new_accession(self):
+        with self.lock:
+            self.next_accession += 1
+            return self.next_accession
+
+    def record(self, identifier):
+        with self.lock:
+            record = self.records.get(identifier)
+
+        # Unknown accessions are served as host records, unknown aliases are absent
+        if record is None and identifier.startswith(("SAMEA", "ERS")):
+            record = sample_xml(identifier, HOST_ATTRIBUTES)
+
+        return record
+
+    def submit(self, parts):
+        submission = ElementTree.fromstring(parts["SUBMISSION"])
+        sample_set = ElementTree.fromstring(parts["SAMPLE"])
+        action = "MODIFY" if submission.find(".//MODIFY") is not None else "ADD"
+
+        if self.random.random() < self.reject_rate:
+            return (
+                '<RECEIPT success="false"><MESSAGES>'
+                "<ERROR>Injected rejection by mock ENA</ERROR>"
+                f"</MESSAGES><ACTIONS>{action}</ACTIONS></RECEIPT>"
+            )
+
+        receipt_samples = []
+        for sample in sample_set.iter("SAMPLE"):
+            if action == "ADD":
+                number = self.new_accession()
+                accession, sra_accession = f"SAMEA{number:09d}", f"ERS{number:09d}"
+                ElementTree.SubElement(
+                    ElementTree.SubElement(sample, "IDENTIFIERS"),
+                    "EXTERNAL_ID",
+                    namespace="BioSample",
+                ).text = accession
+                sample.set("accession", sra_accession)
+            else:
+                sra_accession = sample.get("accession")
+                accession = sample.findtext("IDENTIFIERS/EXTERNAL_ID") or sra_accession
+
+            record = "<SAMPLE_SET>" + ElementTree.tostring(sample, encoding="unicode") + "</SAMPLE_SET>"
+            with self.lock:
+                self.records[accession] = record
+                if sample.get("alias"):
+                    self.records[sample.get("alias")] = record
+
+            receipt_samples.append(
+                f'<SAMPLE accession="{sra_accession}" alias="{escape(sample.get("alias") or "")}" '
+                f'status="PRIVATE"><EXT_ID accession="{accession}" type="biosample"/></SAMPLE>'
+            )
+
+        return (
+            '<RECEIPT receiptDate="2024-01-01T00:00:00.000Z" success="true">'
+            + "".join(receipt_samples)
+            + f'<SUBMISSION accession="ERA{self.new_accession():09d}" alias="mock"/>'
+            + f"<MESSAGES><INFO>Submission handled by mock ENA</INFO></MESSAGES><ACTIONS>{action}</ACTIONS>"
+            + "</RECEIPT>"
+        )
+
+
+class MockEnaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+
+        if path.startswith("/ena/browser/api/xml/ERC"):
+            endpoint = "checklist"
+        elif path.startswith("/ena/browser/api/xml/"):
+            endpoint = "host sample"
+        elif path.startswith("/ena/submit/drop-box/samples/"):
+            endpoint = "drop-box sample"
+        elif path.startswith("/biosamples/samples/"):
+            endpoint = "biosample"
+        elif path.startswith("/ena/taxonomy/rest/"):
+            endpoint = "taxonomy"
+        else:
+            return self.reply(404, "not found")
+
+        if not self.before(endpoint):
+            return
+
+        identifier = urllib.parse.unquote(path.rstrip("/").rsplit("/", 1)[-1])
+
+        if endpoint == "checklist":
+            body = checklist_xml(identifier)
+            etag = '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                return self.reply(304, "", {"ETag": etag})
+            return self.reply(200, body, {"ETag": etag})
+
+        if endpoint == "taxonomy":
+            # Every numeric taxId and every name is known, except "unknown"
+            if path.startswith("/ena/taxonomy/rest/tax-id/") and identifier.isdigit():
+                return self.reply(200, json.dumps({"taxId": identifier, "scientificName": f"taxon {identifier}"}),
+                                  {"Content-Type": "application/json"})
+            if path.startswith("/ena/taxonomy/rest/scientific-name/") and identifier != "unknown":
+                return self.reply(200, json.dumps([{"taxId": "955", "scientificName": identifier}]),
+                                  {"Content-Type": "application/json"})
+            return self.reply(404, "not found")
+
+        if endpoint == "biosample":
+            return self.reply(200, json.dumps({"accession": identifier}), {"Content-Type": "application/json"})
+
+        record = self.server.ena.record(identifier)
+        if record is None:
+            return self.reply(404, "not found")
+
+        return self.reply(200, record)
+
+    def do_POST(self):
+        if not self.path.startswith("/ena/submit/drop-box/submit"):
+            return self.reply(404, "not found")
+
+        body = self.read_body()
+        if not self.before("submit"):
+            return
+
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + body
+        )
+        parts = {
+            part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+            for part in message.iter_parts()
+        }
+
+        self.reply(200, self.server.ena.submit(parts))
+
+    def before(self, endpoint):
+        ena = self.server.ena
+        roll = ena.count(endpoint)
+
+        if ena.latency:
+            time.sleep(ena.latency)
+
+        if roll < ena.error_rate:
+            self.reply(500, "Injected error by mock ENA")
+            return False
+
+        return True
+
+    def read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return b"".join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def reply(self, status, body, headers=None):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/xml")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_server(port=0, **options):
+    """Start a mock ENA in a background thread, returning the server."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockEnaHandler)
+    server.daemon_threads = True
+    server.ena = MockEna(**options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="fraction of submissions rejected in the receipt")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = start_server(
+        args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        reject_rate=args.reject_rate,
+        seed=args.seed,
+    )
+    print(f"Mock ENA listening on http://127.0.0.1:{server.server_address[1]}")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print(dict(server.ena.requests))
+
+
+if __name__ == "__main__":
+    main()
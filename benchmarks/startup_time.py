@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Measure CLI startup time of the enabiosamples scripts.
+
+Runs each script's --help several times and reports the median wall time,
+along with the time Python spends importing modules (from -X importtime)
+and the slowest top-level imports. Then runs each ENA script on a small
+batch against a local mock ENA (benchmarks/mock_ena.py), where startup is
+most of the cost, and reports the median wall time. check_jira_issues
+needs a Jira server, so only its --help is timed. Run it on two commits
+to compare.
+
+    python benchmarks/startup_time.py [--runs 10] [--top 5] [--batch-size 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_ena import start_server
+from throughput import SCENARIOS, run_script, write_credentials
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_DIR = os.path.join(ROOT, "src", "enabiosamples")
+
+SCRIPTS = [
+    "generate_cobiont_biosampleId.py",
+    "metagenome_biosamples.py",
+    "update_ena_record.py",
+    "update_metagenome_ena_record.py",
+    "check_jira_issues.py",
+]
+
+
+def run_help(script, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += [script, "--help"]
+
+    env = dict(os.environ, PYTHONPATH=os.path.join(ROOT, "src"))
+    start = time.perf_counter()
+    result = subprocess.run(
+        command, cwd=SCRIPT_DIR, env=env, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+
+    if result.returncode != 0:
+        raise Exception(f"{script} --help failed:\n{result.stderr}")
+
+    return elapsed, result.stderr
+
+
+def top_level_imports(importtime_output):
+    # Lines look like "import time:  self [us] | cumulative | imported package",
+    # top-level imports have no extra indentation before the module name
+    imports = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):
+            imports.append((int(cumulative), name.strip()))
+
+    return sorted(imports, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=10)
+    args = parser.parse_args()
+
+    for script in SCRIPTS:
+        timings = [run_help(script)[0] for _ in range(args.runs)]
+        imports = top_level_imports(run_help(script, importtime=True)[1])
+
+        print(
+            f"{script}: median {statistics.median(timings) * 1000:.0f} ms, "
+            f"imports {sum(us for us, _ in imports) / 1000:.0f} ms"
+        )
+        for us, name in imports[: args.top]:
+            print(f"    {us / 1000:8.1f} ms  {name}")
+
+    server = start_server()
+
+    for name, make_inputs in SCENARIOS.items():
+        timings = []
+        for _ in range(args.runs):
+            with tempfile.TemporaryDirectory() as workdir:
+                credentials_path = write_credentials(workdir, server)
+                command = make_inputs(workdir, args.batch_size)
+                timings.append(run_script(workdir, command, credentials_path)[0])
+
+        print(
+            f"{name} ({args.batch_size} samples): "
+            f"median {statistics.median(timings) * 1000:.0f} ms"
+        )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+"""
+End-to-end throughput benchmark of the enabiosamples scripts.
+
+Generates inputs of each size, runs every script against a local mock ENA
+(benchmarks/mock_ena.py) and reports the requests issued, wall time, peak
+RSS and samples per second of each run.
+
+    python benchmarks/throughput.py [--sizes 10,1000,100000] [--latency 0.02]
+"""
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_ena import start_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_DIR = os.path.join(ROOT, "src", "enabiosamples")
+BIN_TEMPLATE = os.path.join(ROOT, "test_data", "binned_biosample.csv")
+
+# Bins and MAGs submitted per primary metagenome
+BINS_PER_PRIMARY = 100
+# Cobionts sharing each host
+COBIONTS_PER_HOST = 10
+
+
+def write_csv(path, header, rows):
+    with open(path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return path
+
+
+def host_accession(i):
+    return f"SAMEA{800000000 + i}"
+
+
+def metagenome_inputs(workdir, size):
+    with open(BIN_TEMPLATE, newline="") as template_file:
+        template = next(csv.DictReader(template_file))
+
+    primaries = max(1, size // (BINS_PER_PRIMARY + 1))
+    bins_per_primary = max(0, size // primaries - 1)
+
+    primary_rows = []
+    for p in range(primaries):
+        bin_rows = []
+        for b in range(bins_per_primary):
+            bin_row = dict(template)
+            bin_row["bin_name"] = f"bench_{p}_bin_{b}"
+            bin_row["tol_id"] = f"bench{p}.bin_{b}"
+            bin_rows.append(bin_row)
+
+        bin_path = os.path.join(workdir, f"bins_{p}.csv")
+        write_csv(bin_path, list(template), [list(row.values()) for row in bin_rows])
+
+        primary_rows.append(
+            [host_accession(p), "Vulpes vulpes", 9627, "mammal metagenome", 3127350,
+             f"bench{p}.metagenome", "arid biome", "sclerophyllous forest biome",
+             "adult mammal tissue", bin_path, ""]
+        )
+
+    primary_path = write_csv(
+        os.path.join(workdir, "primary.csv"),
+        ["host_biospecimen", "host_taxname", "host_taxid", "metagenome_taxname",
+         "metagenome_taxid", "metagenome_tolid", "broad-scale environmental context",
+         "local environmental context", "environmental medium", "binned_path", "mag_path"],
+        primary_rows,
+    )
+
+    return ["metagenome_biosamples.py", "-p", "bench", "-o", "out.tsv", "-l", "run.log", primary_path]
+
+
+def cobiont_inputs(workdir, size):
+    path = write_csv(
+        os.path.join(workdir, "cobionts.csv"),
+        ["host_biospecimen", "cobiont_taxname", "cobiont_taxid", "cobiont_tolid"],
+        [[host_accession(i // COBIONTS_PER_HOST), "Wolbachia sp.", 955, f"bench{i}.cobiont"]
+         for i in range(size)],
+    )
+
+    return ["generate_cobiont_biosampleId.py", "-p", "bench", "-d", path, "-o", "out.csv"]
+
+
+def update_inputs(workdir, size):
+    path = write_csv(
+        os.path.join(workdir, "updates.csv"),
+        ["biosample_accession", "cobiont_tolid"],
+        [[host_accession(i), f"bench{i}.cobiont"] for i in range(size)],
+    )
+
+    return ["update_ena_record.py", "-d", path, "-r", "report.tsv"]
+
+
+def metagenome_update_inputs(workdir, size):
+    path = write_csv(
+        os.path.join(workdir, "metagenome_updates.csv"),
+        ["biosampleid", "host scientific name", "host taxid", "host biosampleid",
+         "broadscale_environmental_context", "local_environmental_context",
+         "environmental_medium"],
+        [[host_accession(i), "Vulpes vulpes", 9627, host_accession(size + i), "arid biome",
+          "sclerophyllous forest biome", "adult mammal tissue"] for i in range(size)],
+    )
+
+    return ["update_metagenome_ena_record.py", "-d", path, "-r", "report.tsv"]
+
+
+SCENARIOS = {
+    "metagenome_biosamples": metagenome_inputs,
+    "generate_cobiont_biosampleId": cobiont_inputs,
+    "update_ena_record": update_inputs,
+    "update_metagenome_ena_record": metagenome_update_inputs,
+}
+
+
+def write_credentials(workdir, server, max_requests_per_second=None, workers=4):
+    # Credentials pointing every ENA call, and every cache, at the mock
+    credentials_path = os.path.join(workdir, "credentials.json")
+    with open(credentials_path, "w") as credentials_file:
+        json.dump({"credentials": {
+            "uri": f"http://127.0.0.1:{server.server_address[1]}",
+            "user": "bench",
+            "password": "bench",
+            "contact_name": "Bench",
+            "contact_email": "bench@example.org",
+            "transport": {"max_requests_per_second": max_requests_per_second},
+            "workers": workers,
+            "checklist_cache": {"dir": os.path.join(workdir, "checklists")},
+            "taxonomy": {"dir": workdir},
+        }}, credentials_file)
+
+    return credentials_path
+
+
+def run_script(workdir, command, credentials_path):
+    script, *args = command
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join([os.path.join(ROOT, "src"), SCRIPT_DIR]),
+    )
+
+    stderr_path = os.path.join(workdir, "stderr.txt")
+    with open(stderr_path, "w") as stderr_file:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(SCRIPT_DIR, script), "-a", credentials_path, *args],
+            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=stderr_file,
+        )
+        # wait4 reports the resource usage of this child alone
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+
+    if os.waitstatus_to_exitcode(status) != 0:
+        with open(stderr_path) as stderr_file:
+            raise Exception(f"{script} failed:\n{stderr_file.read()}")
+
+    # ru_maxrss is in kilobytes on Linux
+    return elapsed, usage.ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10,1000,100000")
+    parser.add_argument("--scripts", default=",".join(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the mock adds to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--reject-rate", type=float, default=0.0)
+    parser.add_argument("--max-requests-per-second", type=float, default=None)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    server = start_server(
+        latency=args.latency, error_rate=args.error_rate, reject_rate=args.reject_rate
+    )
+    ena = server.ena
+
+    print(f"{'script':<30} {'samples':>8} {'requests':>9} {'wall s':>8} {'peak MB':>8} {'samples/s':>10}")
+
+    for size in [int(size) for size in args.sizes.split(",")]:
+        for name in args.scripts.split(","):
+            with tempfile.TemporaryDirectory() as workdir:
+                credentials_path = write_credentials(
+                    workdir, server, args.max_requests_per_second, args.workers
+                )
+
+                command = SCENARIOS[name](workdir, size)
+
+                ena.reset_counters()
+                elapsed, peak_mb = run_script(workdir, command, credentials_path)
+                requests = sum(ena.requests.values())
+
+            print(f"{name:<30} {size:>8} {requests:>9} {elapsed:>8.2f} {peak_mb:>8.1f} {size / elapsed:>10.1f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
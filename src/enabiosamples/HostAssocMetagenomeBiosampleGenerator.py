@@ -1,12 +1,19 @@
 #!/usr/bin/env python
 
-import datetime
-import io
-import re
+import logging
 import uuid
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Collection, Dict, List, Optional, Tuple
 
+from enabiosamples.checklist_validator import ChecklistValidator
 from enabiosamples.ena_datasource import EnaDataSource
+from enabiosamples.run_journal import RunJournal, stable_sample_uuid
+from enabiosamples.run_log import get_logger
+
+# Checklist value for this assembly quality has no trailing full stop
+MANY_FRAGMENTS_QUALITY = (
+    "Many fragments with little to no review of assembly other than "
+    "reporting of standard assembly statistics"
+)
 
 
 class HostAssocMetagenomeBiosampleGenerator:
@@ -14,23 +21,75 @@ class HostAssocMetagenomeBiosampleGenerator:
         self,
         ena_datasource: EnaDataSource,
         project_name: str,
-        log_file: Optional[str] = None,
+        journal: Optional[RunJournal] = None,
     ):
         self.ena_datasource = ena_datasource
         self.project_name = project_name
-        self.log_file = (
-            log_file
-            or f"cobiont_{project_name}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        self.journal = journal
+        self.logger = get_logger("metagenome")
+
+    def log(self, message: str, level: int = logging.INFO) -> None:
+        self.logger.log(level, message)
+
+    def sample_title(self, tolid: str, specimen_type: str) -> str:
+        """
+        Title in the format <unique id>-<project name>-<specimen_type>.
+
+        The unique id is derived from the project, specimen type and ToLID,
+        so a rerun of the same input produces the same title and alias.
+        """
+        unique_id = stable_sample_uuid(self.project_name, specimen_type, tolid)
+
+        return f"{unique_id}-{self.project_name}-{specimen_type}"
+
+    def split_accessioned(
+        self, samples_dict: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Split samples into (already accessioned in the journal, to submit)."""
+        if self.journal is None:
+            return {}, samples_dict
+
+        done, todo = self.journal.split_accessioned(
+            samples_dict, self.ena_datasource.find_submitted_aliases
         )
+        if done:
+            self.log(f"Skipping {len(done)} samples already accessioned in journal")
 
-    def log(self, message: str) -> None:
-        curr_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return done, todo
 
-        if isinstance(self.log_file, io.TextIOWrapper):
-            self.log_file.write(f"({curr_time}) {message}\n")
-        else:
-            with open(self.log_file, "a") as file_obj:
-                file_obj.write(f"({curr_time}) {message}\n")
+    def journal_summary(
+        self,
+        primary_data: Dict[str, Any],
+        bin_data_list: List[Dict[str, Any]],
+    ) -> Optional[Dict[str, Any]]:
+        """Summary for a row whose primary and bins are all accessioned, else None."""
+        if self.journal is None:
+            return None
+
+        entries = [
+            self.journal.accessioned(
+                self.sample_title(primary_data["metagenome_tolid"], "metagenome")
+            )
+        ] + [
+            self.journal.accessioned(
+                self.sample_title(bin_data["tol_id"], bin_data["bin_name"])
+            )
+            for bin_data in bin_data_list
+        ]
+
+        if not all(entries):
+            return None
+
+        return {
+            "primary": {
+                "tolid": entries[0]["tolid"],
+                "biosample": entries[0]["biosample_accession"],
+            },
+            "magsbins": [
+                {"tolid": entry["tolid"], "biosample": entry["biosample_accession"]}
+                for entry in entries[1:]
+            ],
+        }
 
     def copy_checklist_items(
         self,
@@ -76,7 +135,8 @@ class HostAssocMetagenomeBiosampleGenerator:
                         child_val[0] = f"{coordinate:.2f}"
                     except ValueError:
                         self.log(
-                            f"Warning: Could not parse {host_val} value '{child_val[0]}' as a number"
+                            f"Could not parse {host_val} value '{child_val[0]}' as a number",
+                            logging.WARNING,
                         )
 
                     primary_mg_dict[host_key] = child_val
@@ -107,55 +167,41 @@ class HostAssocMetagenomeBiosampleGenerator:
                     optional_missing.append(field_key)
 
         if mandatory_missing:
-            self.log("Missing mandatory fields:")
-            for field in mandatory_missing:
-                self.log(f"  {field}")
+            self.log(
+                f"Missing mandatory fields: {', '.join(mandatory_missing)}",
+                logging.WARNING,
+            )
 
         return primary_mg_dict
 
     def validate_samples_with_checklist(
-        self, field_dict: Dict[str, Any], samples_dict: Dict[str, Any]
+        self,
+        validator: ChecklistValidator,
+        samples_dict: Dict[str, Any],
+        skip_fields: Collection[str] = (),
     ) -> bool:
-        validation_status = True
-
-        for sample_key, sample_val in samples_dict.items():
-            value_dict = sample_val
-            invalid_text = []
-            invalid_option = []
-
-            for value_key, value_val in value_dict.items():
-                if value_key in field_dict.keys():
-                    if field_dict[value_key][1] == "restricted text":
-                        pattern = re.compile(field_dict[value_key][2])
-                        if not pattern.match(str(value_val[0])):
-                            invalid_text.append(
-                                f"   {value_key} is set to invalid '{value_val[0]}'. "
-                                f"Required regex is: {field_dict[value_key][2]}"
-                            )
-
-                    elif field_dict[value_key][1] == "text choice":
-                        if value_val[0] not in field_dict[value_key][2]:
-                            invalid_option.append(
-                                f"   {value_key} is set to invalid option "
-                                f"'{value_val[0]}'. Valid options are: {field_dict[value_key][2]}"
-                            )
-
-            # Log validation errors
-            if invalid_text or invalid_option:
-                self.log("================")
-                self.log(
-                    f"{sample_key} - {sample_val.get('taxon_id', ['N/A'])[0]} - {sample_val.get('tolid', ['N/A'])[0]}"
-                )
-                for field in invalid_text:
-                    self.log(field)
-                for field in invalid_option:
-                    self.log(field)
-                self.log("================")
+        validation_errors = validator.validate(samples_dict, skip_fields)
+
+        # Log validation errors
+        for sample_key, errors in validation_errors.items():
+            sample_val = samples_dict[sample_key]
+            self.log(
+                f"Validation failed for {sample_key} - "
+                f"{sample_val.get('taxon_id', ['N/A'])[0]} - "
+                f"{sample_val.get('tolid', ['N/A'])[0]}: "
+                + "; ".join(error["message"] for error in errors),
+                logging.WARNING,
+            )
 
-            if invalid_text or invalid_option:
-                validation_status = False
+        unknown_taxids = self.ena_datasource.unknown_taxids(samples_dict)
+        for sample_key, taxid in unknown_taxids.items():
+            self.log(
+                f"Validation failed for {sample_key}: taxon_id {taxid} "
+                "is not known to ENA taxonomy",
+                logging.WARNING,
+            )
 
-        return validation_status
+        return not validation_errors and not unknown_taxids
 
     def create_primary_metagenome_sample(
         self, primary_data: Dict[str, Any]
@@ -178,7 +224,7 @@ class HostAssocMetagenomeBiosampleGenerator:
         Returns:
             Dictionary representing the primary metagenome sample
         """
-        primary_uuid = f"{uuid.uuid4()}-{self.project_name}-metagenome"
+        primary_uuid = self.sample_title(primary_data["metagenome_tolid"], "metagenome")
 
         primary_dict = {
             "title": [primary_uuid, None],
@@ -243,7 +289,7 @@ class HostAssocMetagenomeBiosampleGenerator:
         """
         binned_dict = {
             "title": [
-                f"{uuid.uuid4()}-{self.project_name}-{binned_data['bin_name']}",
+                self.sample_title(binned_data["tol_id"], binned_data["bin_name"]),
                 None,
             ],
             "taxon_id": [binned_data["taxon_id"], None],
@@ -287,19 +333,50 @@ class HostAssocMetagenomeBiosampleGenerator:
             "metagenomic source": [binned_data["metagenomic source"], None],
         }
 
-        if (
-            binned_dict["assembly quality"][0]
-            == "Many fragments with little to no review of assembly other than reporting of standard assembly statistics."
-        ):
-            binned_dict["assembly quality"][0] = (
-                "Many fragments with little to no review of assembly other than reporting of standard assembly statistics"
-            )
+        if binned_dict["assembly quality"][0] == MANY_FRAGMENTS_QUALITY + ".":
+            binned_dict["assembly quality"][0] = MANY_FRAGMENTS_QUALITY
 
         if binned_dict["completeness score"][0] == 100.0:
             binned_dict["completeness score"][0] = 100
 
         return binned_dict
 
+    def validate_bin_frame(self, bin_df, checklist: str) -> Tuple[Any, Any]:
+        """
+        Validate a whole bin/MAG DataFrame against a checklist in one pass.
+
+        Applies the same value fixes as create_bin_sample, then checks every
+        checklist field that is a CSV column as a polars expression.
+
+        Returns:
+            (rows of bin_df that passed, error frame with one row per failing
+            value as returned by ChecklistValidator.validate_frame)
+        """
+        import polars as pl
+
+        validator = self.ena_datasource.get_checklist_validator(checklist)
+
+        # Mirror the fixes create_bin_sample makes before row validation
+        normalised_df = bin_df.with_columns(
+            pl.when(pl.col("assembly quality") == MANY_FRAGMENTS_QUALITY + ".")
+            .then(pl.lit(MANY_FRAGMENTS_QUALITY))
+            .otherwise(pl.col("assembly quality"))
+            .alias("assembly quality"),
+            pl.when(pl.col("completeness score") == 100.0)
+            .then(pl.lit("100"))
+            .otherwise(pl.col("completeness score").cast(pl.String))
+            .alias("completeness score"),
+        )
+
+        error_df = validator.validate_frame(normalised_df)
+        valid_df = (
+            bin_df.with_row_index("row")
+            .filter(~pl.col("row").is_in(error_df["row"].to_list()))
+            .drop("row")
+        )
+
+        return valid_df, error_df
+
     def process_primary_metagenome(
         self, primary_data: Dict[str, Any]
     ) -> Tuple[bool, Dict[str, Any], Dict[str, Any]]:
@@ -333,7 +410,8 @@ class HostAssocMetagenomeBiosampleGenerator:
         self.log("Validate primary checklist items")
         primary_samples_dict = {primary_sample_dict["title"][0]: primary_sample_dict}
         validation_passed = self.validate_samples_with_checklist(
-            tol_field_dict, primary_samples_dict
+            self.ena_datasource.get_checklist_validator("ERC000013"),
+            primary_samples_dict,
         )
 
         return validation_passed, primary_sample_dict, host_sample_dict
@@ -345,6 +423,7 @@ class HostAssocMetagenomeBiosampleGenerator:
         host_scientific_name: str,
         host_taxid: str,
         checklist: str,
+        prevalidated: bool = False,
     ) -> Tuple[bool, Dict[str, Any]]:
         """
         Process and validate metagenome bins.
@@ -352,6 +431,9 @@ class HostAssocMetagenomeBiosampleGenerator:
         Takes a list of metagenome bin dicts, a primary dict,
         and a checklist, and some metadata. For each dict,
         process it and validate the result against the checklist.
+        With ``prevalidated``, the fields that came from the CSV columns
+        already passed validate_bin_frame, so only the fields added here
+        (from the host, the primary and the row metadata) are checked.
         """
         self.log("Processing binned samples")
 
@@ -365,7 +447,7 @@ class HostAssocMetagenomeBiosampleGenerator:
                 binned_data, host_scientific_name, host_taxid, checklist
             )
 
-            self.log(f"Copy checklist items for binned {i}")
+            self.log(f"Copy checklist items for binned {i}", logging.DEBUG)
             binned_sample_dict = self.copy_checklist_items(
                 bm_field_dict, primary_dict, binned_dict
             )
@@ -373,24 +455,33 @@ class HostAssocMetagenomeBiosampleGenerator:
 
         # Validate
         self.log("Validate binned checklist items")
+        # Every bin dict has the columns of the frame that was validated
+        checked_columns = set(binned_data_list[0]) if prevalidated else set()
         validation_passed = self.validate_samples_with_checklist(
-            bm_field_dict, binned_samples_dict
+            self.ena_datasource.get_checklist_validator(checklist),
+            binned_samples_dict,
+            checked_columns,
         )
 
         return validation_passed, binned_samples_dict
 
-    def generate_biosample_ids(
+    def prepare_samples(
         self,
         primary_data: Dict[str, Any],
         binned_data_list: Optional[List[Dict[str, Any]]] = None,
         mag_data_list: Optional[List[Dict[str, Any]]] = None,
-    ) -> Tuple[bool, Dict[str, Any]]:
+        prevalidated: bool = False,
+    ) -> Tuple[bool, Dict[str, Any], Dict[str, Any]]:
         """
-        Generate ENA biosample IDs for metagenome samples. Takes a single primary dict,
-        and two lists of bin dicts - mags and binned metagenomes.
+        Build and validate the primary, binned and MAG samples of one row.
+
+        With ``prevalidated``, the binned and MAG lists already passed
+        validate_bin_frame and their CSV columns are not validated against
+        their checklists again.
 
         Returns:
-            dict of dicts - { tolid, biosample } for each of 'primary', 'magsbins'
+            whether every sample passed validation, the primary sample dict
+            and the binned and MAG sample dicts keyed by title
         """
         # Process primary metagenome
         primary_validation_passed, primary_sample_dict, host_sample_dict = (
@@ -398,8 +489,8 @@ class HostAssocMetagenomeBiosampleGenerator:
         )
 
         if not primary_validation_passed:
-            self.log("Primary validation failed")
-            return False, {"error": "Primary validation failed"}
+            self.log("Primary validation failed", logging.ERROR)
+            return False, primary_sample_dict, {}
 
         # Process binned and MAG samples
         binned_samples_dict = {}
@@ -414,6 +505,7 @@ class HostAssocMetagenomeBiosampleGenerator:
                 primary_data["host_taxname"],
                 primary_data["host_taxid"],
                 "ERC000050",
+                prevalidated,
             )
 
         if mag_data_list:
@@ -423,6 +515,7 @@ class HostAssocMetagenomeBiosampleGenerator:
                 primary_data["host_taxname"],
                 primary_data["host_taxid"],
                 "ERC000047",
+                prevalidated,
             )
 
         if not (
@@ -430,77 +523,311 @@ class HostAssocMetagenomeBiosampleGenerator:
             and binned_validation_passed
             and mag_validation_passed
         ):
-            self.log("Validation failed")
+            self.log("Validation failed", logging.ERROR)
+            return False, primary_sample_dict, {}
+
+        return True, primary_sample_dict, {**binned_samples_dict, **mag_samples_dict}
+
+    def submit_samples_in_chunks(
+        self, samples_dict: Dict[str, Any], kind: str
+    ) -> Tuple[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Submit samples as chunked SAMPLE_SETs, skipping those in the journal.
+
+        Returns:
+            overall success, every accessioned sample (including those
+            already in the journal) and the chunk reports of
+            EnaDataSource.generate_ena_ids_for_samples_in_chunks
+        """
+        done_dict, samples_dict = self.split_accessioned(samples_dict)
+        success, submission_dict, chunk_reports = True, {}, []
+
+        if samples_dict:
+            if self.journal:
+                self.journal.record_pending(samples_dict, kind)
+
+            success, submission_dict, chunk_reports = (
+                self.ena_datasource.generate_ena_ids_for_samples_in_chunks(
+                    samples_dict
+                )
+            )
+
+            if self.journal:
+                self.journal.record_submitted(submission_dict)
+
+            for report in chunk_reports:
+                if not report["success"]:
+                    if self.journal:
+                        self.journal.record_failed(report["titles"])
+                    self.log(
+                        f"Chunk {report['chunk']} failed "
+                        f"({len(report['titles'])} samples)"
+                    )
+                    for val in report["errors"].values():
+                        self.log(str(val))
+
+        submission_dict.update(done_dict)
+
+        return success, submission_dict, chunk_reports
+
+    def build_summary(
+        self, primary_dict: Dict[str, Any], bin_samples_dict: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """{ tolid, biosample } for each of 'primary', 'magsbins'."""
+        return {
+            "primary": {
+                "tolid": primary_dict["tolid"][0],
+                "biosample": primary_dict["biosample_accession"][0],
+            },
+            "magsbins": [
+                {"tolid": val["tolid"][0], "biosample": val["biosample_accession"][0]}
+                for val in bin_samples_dict.values()
+            ],
+        }
+
+    def generate_biosample_ids(
+        self,
+        primary_data: Dict[str, Any],
+        binned_data_list: Optional[List[Dict[str, Any]]] = None,
+        mag_data_list: Optional[List[Dict[str, Any]]] = None,
+        prevalidated: bool = False,
+    ) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Generate ENA biosample IDs for metagenome samples. Takes a single primary dict,
+        and two lists of bin dicts - mags and binned metagenomes. ``prevalidated``
+        is passed on to prepare_samples.
+
+        Returns:
+            dict of dicts - { tolid, biosample } for each of 'primary', 'magsbins'
+        """
+        # Skip rows a previous run already accessioned completely
+        journal_summary = self.journal_summary(
+            primary_data, (binned_data_list or []) + (mag_data_list or [])
+        )
+        if journal_summary is not None:
+            self.log(
+                f"{primary_data['metagenome_tolid']} already accessioned in journal"
+            )
+            return True, journal_summary
+
+        validation_passed, primary_sample_dict, bin_samples_dict = (
+            self.prepare_samples(
+                primary_data, binned_data_list, mag_data_list, prevalidated
+            )
+        )
+
+        if not validation_passed:
             return False, {"error": "Validation failed"}
 
         # Submit to ENA
         self.log("Generate ENA IDs for primary samples")
         primary_samples_dict = {primary_sample_dict["title"][0]: primary_sample_dict}
-        primary_success, primary_submission_dict = (
-            self.ena_datasource.generate_ena_ids_for_samples(
-                uuid.uuid4(), primary_samples_dict
-            )
+        primary_done_dict, primary_samples_dict = self.split_accessioned(
+            primary_samples_dict
         )
+        primary_submission_dict = {}
 
-        if not primary_success:
-            self.log("ENA generation failed for primary")
-            for val in primary_submission_dict.values():
-                self.log(str(val))
-            return False, {
-                "error": "Primary ENA submission failed",
-                "details": primary_submission_dict,
-            }
+        if primary_samples_dict:
+            if self.journal:
+                self.journal.record_pending(primary_samples_dict, "primary")
 
-        self.log("ENA generation succeeded for primary")
+            primary_success, primary_submission_dict = (
+                self.ena_datasource.generate_ena_ids_for_samples(
+                    uuid.uuid4(), primary_samples_dict
+                )
+            )
+
+            if not primary_success:
+                self.log("ENA generation failed for primary", logging.ERROR)
+                for val in primary_submission_dict.values():
+                    self.log(str(val))
+                if self.journal:
+                    self.journal.record_failed(primary_samples_dict)
+                return False, {
+                    "error": "Primary ENA submission failed",
+                    "details": primary_submission_dict,
+                }
+
+            if self.journal:
+                self.journal.record_submitted(primary_submission_dict)
+            self.log("ENA generation succeeded for primary")
+
+        primary_submission_dict.update(primary_done_dict)
         primary_uuid = primary_sample_dict["title"][0]
         primary_metagenome_dict = primary_submission_dict[primary_uuid]
 
         # Submit binned and MAG samples if they exist
         binned_mag_submission_dict = {}
-        if binned_samples_dict or mag_samples_dict:
-            # Combine binned and MAG samples
-            combined_samples_dict = {**binned_samples_dict, **mag_samples_dict}
-
+        if bin_samples_dict:
             # Add primary biosample ID to derived samples
-            if primary_metagenome_dict.get("biosample_accession", [None])[0]:
-                updated_combined_samples_dict = {}
-                for key, val in combined_samples_dict.items():
-                    val["sample derived from"] = [
-                        primary_metagenome_dict["biosample_accession"][0],
-                        None,
-                    ]
-                    updated_combined_samples_dict[key] = val
-
-                self.log("Generate ENA IDs for binned/MAG samples")
-                combined_success, binned_mag_submission_dict = (
-                    self.ena_datasource.generate_ena_ids_for_samples(
-                        uuid.uuid4(), updated_combined_samples_dict
+            primary_accession = primary_metagenome_dict.get(
+                "biosample_accession", [None]
+            )[0]
+
+            if not primary_accession:
+                self.log(
+                    "Biosample accession not returned for primary metagenome",
+                    logging.ERROR,
+                )
+                return False, {"error": "Primary biosample accession not available"}
+
+            for val in bin_samples_dict.values():
+                val["sample derived from"] = [primary_accession, None]
+
+            self.log("Generate ENA IDs for binned/MAG samples")
+            combined_success, binned_mag_submission_dict, chunk_reports = (
+                self.submit_samples_in_chunks(bin_samples_dict, "bin")
+            )
+
+            if not combined_success:
+                self.log("ENA generation failed for binned/mag", logging.ERROR)
+                return False, {
+                    "error": "Binned/MAG ENA submission failed",
+                    "details": [
+                        report for report in chunk_reports if not report["success"]
+                    ],
+                    "submitted": binned_mag_submission_dict,
+                }
+
+            self.log("ENA generation succeeded for binned/mag")
+
+        return True, self.build_summary(
+            primary_metagenome_dict, binned_mag_submission_dict
+        )
+
+    def generate_biosample_ids_batch(
+        self,
+        rows: List[
+            Tuple[
+                Dict[str, Any],
+                Optional[List[Dict[str, Any]]],
+                Optional[List[Dict[str, Any]]],
+            ]
+        ],
+        prevalidated: bool = False,
+    ) -> Tuple[bool, List[Dict[str, Any]]]:
+        """
+        Generate ENA biosample IDs for many rows in two submission phases.
+
+        Takes a list of (primary dict, binned dicts, MAG dicts) rows, whose
+        bins are prevalidated as for prepare_samples. Every
+        valid primary is submitted together first, then every binned and MAG
+        sample whose primary got an accession, each phase chunked only as
+        submission limits require.
+
+        Returns:
+            whether every row succeeded, and for each row in order the
+            summary or error dict generate_biosample_ids would return
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+        prepared = {}
+
+        for i, (primary_data, binned_data_list, mag_data_list) in enumerate(rows):
+            journal_summary = self.journal_summary(
+                primary_data, (binned_data_list or []) + (mag_data_list or [])
+            )
+            if journal_summary is not None:
+                self.log(
+                    f"{primary_data['metagenome_tolid']} already accessioned in journal"
+                )
+                results[i] = journal_summary
+                continue
+
+            try:
+                validation_passed, primary_sample_dict, bin_samples_dict = (
+                    self.prepare_samples(
+                        primary_data, binned_data_list, mag_data_list, prevalidated
                     )
                 )
+            except Exception as e:
+                # One bad row (e.g. an unknown host) must not sink the batch
+                self.log(
+                    f"Error preparing {primary_data['metagenome_tolid']}: {e}",
+                    logging.ERROR,
+                )
+                results[i] = {"error": str(e)}
+                continue
 
-                if not combined_success:
-                    self.log("ENA generation failed for binned/mag")
-                    for val in binned_mag_submission_dict.values():
-                        self.log(str(val))
-                    return False, {
-                        "error": "Binned/MAG ENA submission failed",
-                        "details": binned_mag_submission_dict,
-                    }
-
-                self.log("ENA generation succeeded for binned/mag")
-            else:
-                self.log("Biosample accession not returned for primary metagenome")
-                return False, {"error": "Primary biosample accession not available"}
+            if not validation_passed:
+                results[i] = {"error": "Validation failed"}
+                continue
 
-        summary = {
-            "primary": {
-                "tolid": primary_metagenome_dict["tolid"][0],
-                "biosample": primary_metagenome_dict["biosample_accession"][0],
-            },
-            "magsbins": [
-                {"tolid": val["tolid"][0], "biosample": val["biosample_accession"][0]}
-                for key, val in binned_mag_submission_dict.items()
-            ],
+            prepared[i] = (primary_sample_dict, bin_samples_dict)
+
+        # Phase one: every primary at once
+        primary_samples_dict = {
+            primary_sample_dict["title"][0]: primary_sample_dict
+            for primary_sample_dict, _ in prepared.values()
         }
+        self.log(f"Generate ENA IDs for {len(primary_samples_dict)} primary samples")
+        _, primary_submission_dict, primary_reports = self.submit_samples_in_chunks(
+            primary_samples_dict, "primary"
+        )
+
+        # Phase two: every bin and MAG whose primary was accessioned
+        combined_samples_dict = {}
+        for i, (primary_sample_dict, bin_samples_dict) in prepared.items():
+            primary_uuid = primary_sample_dict["title"][0]
+            primary_accession = primary_submission_dict.get(
+                primary_uuid, {"biosample_accession": [None]}
+            )["biosample_accession"][0]
+
+            if not primary_accession:
+                self.log(
+                    f"ENA generation failed for primary {primary_sample_dict['tolid'][0]}",
+                    logging.ERROR,
+                )
+                results[i] = {
+                    "error": "Primary ENA submission failed",
+                    "details": [
+                        report
+                        for report in primary_reports
+                        if primary_uuid in report["titles"]
+                    ],
+                }
+                continue
+
+            for val in bin_samples_dict.values():
+                val["sample derived from"] = [primary_accession, None]
+            combined_samples_dict.update(bin_samples_dict)
+
+        self.log(
+            f"Generate ENA IDs for {len(combined_samples_dict)} binned/MAG samples"
+        )
+        _, binned_mag_submission_dict, bin_reports = self.submit_samples_in_chunks(
+            combined_samples_dict, "bin"
+        )
+
+        for i, (primary_sample_dict, bin_samples_dict) in prepared.items():
+            if results[i] is not None:
+                continue
+
+            submitted = {
+                title: binned_mag_submission_dict[title]
+                for title in bin_samples_dict
+                if title in binned_mag_submission_dict
+            }
+
+            if len(submitted) < len(bin_samples_dict):
+                self.log(
+                    "ENA generation failed for binned/mag of "
+                    f"{primary_sample_dict['tolid'][0]}",
+                    logging.ERROR,
+                )
+                results[i] = {
+                    "error": "Binned/MAG ENA submission failed",
+                    "details": [
+                        report
+                        for report in bin_reports
+                        if not report["success"]
+                        and not set(report["titles"]).isdisjoint(bin_samples_dict)
+                    ],
+                    "submitted": submitted,
+                }
+                continue
+
+            results[i] = self.build_summary(
+                primary_submission_dict[primary_sample_dict["title"][0]], submitted
+            )
 
-        return True, summary
+        return all("error" not in result for result in results), results
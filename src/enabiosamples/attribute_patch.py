@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+import json
+import xml.etree.ElementTree as ElementTree
+from typing import Any, Dict, List, Optional
+
+ACTIONS = ("set", "replace", "add_if_missing", "remove_if_equals", "migrate_checklist")
+
+
+class AttributePatch:
+    """
+    Declarative patch for the SAMPLE_ATTRIBUTES of existing drop-box records.
+
+    A spec names the CSV column holding each record's accession and a list
+    of rules applied in order:
+
+    - ``set``: set ``tag`` to ``value``, adding the attribute if missing
+    - ``replace``: set ``tag`` to ``value`` only if the attribute exists
+    - ``add_if_missing``: add ``tag`` with ``value`` if it is not present
+    - ``remove_if_equals``: remove ``tag`` where it equals ``value``
+    - ``migrate_checklist``: change ENA-CHECKLIST ``from`` one checklist ``to``
+      another
+
+    A ``value`` is a literal string or ``{"column": <name>}`` to take it from
+    the record's CSV row. A rule with ``"when": {"tag": ..., "equals": ...}``
+    only applies to records where that attribute has that value, as left by
+    the rules before it.
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.key_column = spec["key_column"]
+        self.rules = spec["rules"]
+
+        for rule in self.rules:
+            if rule.get("action") not in ACTIONS:
+                raise Exception(
+                    f"Unknown patch action {rule.get('action')!r}, "
+                    f"expected one of {', '.join(ACTIONS)}"
+                )
+
+    @classmethod
+    def from_file(cls, path: str) -> "AttributePatch":
+        with open(path) as spec_file:
+            return cls(json.load(spec_file))
+
+    def apply(
+        self, root: ElementTree.Element, row: Dict[str, str]
+    ) -> ElementTree.Element:
+        """Patch one record (SAMPLE_SET or SAMPLE element) in place."""
+        sample_attributes = root.find(".//SAMPLE_ATTRIBUTES")
+        if sample_attributes is None:
+            sample = root if root.tag == "SAMPLE" else root.find("SAMPLE")
+            sample_attributes = ElementTree.SubElement(sample, "SAMPLE_ATTRIBUTES")
+
+        # Index attributes by tag once, so no rule rescans the record
+        index: Dict[str, List[ElementTree.Element]] = {}
+        for attribute in sample_attributes:
+            index.setdefault(attribute.findtext("TAG"), []).append(attribute)
+
+        for rule in self.rules:
+            if not self._when(rule.get("when"), index):
+                continue
+
+            action = rule["action"]
+
+            if action == "migrate_checklist":
+                for attribute in index.get("ENA-CHECKLIST", []):
+                    if attribute.findtext("VALUE") == rule["from"]:
+                        self._set_value(attribute, rule["to"])
+                continue
+
+            tag = rule["tag"]
+            value = self._value(rule.get("value"), row)
+            existing = index.get(tag, [])
+
+            if action == "remove_if_equals":
+                kept = []
+                for attribute in existing:
+                    if attribute.findtext("VALUE") == value:
+                        sample_attributes.remove(attribute)
+                    else:
+                        kept.append(attribute)
+                index[tag] = kept
+
+            elif action in ("set", "replace") and existing:
+                for attribute in existing:
+                    self._set_value(attribute, value)
+
+            elif action in ("set", "add_if_missing") and not existing:
+                index[tag] = [self._add_attribute(sample_attributes, tag, value)]
+
+        return root
+
+    def apply_all(
+        self, records: Dict[str, ElementTree.Element], rows: List[Dict[str, str]]
+    ) -> Dict[str, ElementTree.Element]:
+        """Patch every record, keyed by accession, with its row of the CSV."""
+        for row in rows:
+            self.apply(records[row[self.key_column]], row)
+
+        return records
+
+    def _when(
+        self,
+        condition: Optional[Dict[str, str]],
+        index: Dict[str, List[ElementTree.Element]],
+    ) -> bool:
+        if condition is None:
+            return True
+
+        return any(
+            attribute.findtext("VALUE") == condition["equals"]
+            for attribute in index.get(condition["tag"], [])
+        )
+
+    def _value(self, value: Any, row: Dict[str, str]) -> Optional[str]:
+        if isinstance(value, dict):
+            value = row[value["column"]]
+
+        return None if value is None else str(value)
+
+    def _set_value(self, attribute: ElementTree.Element, value: Optional[str]) -> None:
+        value_node = attribute.find("VALUE")
+        if value_node is None:
+            value_node = ElementTree.SubElement(attribute, "VALUE")
+        value_node.text = value
+
+    def _add_attribute(
+        self, sample_attributes: ElementTree.Element, tag: str, value: Optional[str]
+    ) -> ElementTree.Element:
+        attribute = ElementTree.SubElement(sample_attributes, "SAMPLE_ATTRIBUTE")
+        ElementTree.SubElement(attribute, "TAG").text = tag
+        ElementTree.SubElement(attribute, "VALUE").text = value
+
+        return attribute
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+import json
+import os
+from typing import Any, Optional
+
+
+def default_cache_dir(name: Optional[str] = None) -> str:
+    """Per-user cache directory of the package, or of one of its caches."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    path = os.path.join(base, "enabiosamples")
+    return os.path.join(path, name) if name else path
+
+
+def read_json(path: str) -> Optional[Any]:
+    """Load a json cache file, or None if it is missing or unreadable."""
+    try:
+        with open(path, "r") as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path: str, data: Any) -> None:
+    # Write then rename so concurrent runs never see a partial file.
+    # The disk cache is best effort, an unwritable directory is ignored.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w") as cache_file:
+            json.dump(data, cache_file)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
@@ -1,19 +1,42 @@
 #!/usr/bin/env python
 
+import hashlib
+import io
+import json
+import optparse
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from tol_jira_auth import ToLJiraAuth
-import yaml
-from yaml.loader import SafeLoader
-import xml.etree.ElementTree as ElementTree
-from typing import Dict, List, Tuple
-import requests
-from requests.auth import HTTPBasicAuth
-from ena_datasource import EnaDataSource
 
-def get_yaml_attachment(issue):
+# yaml and the taxonomy resolver (with requests behind it) are slow to
+# import, so they are loaded where they are used and --help stays fast
+
+# Fields requested by the issue search, so issues need no further fetch
+ISSUE_FIELDS = "attachment"
+
+# Parsed .yaml attachment of each issue, keyed by issue key, so every
+# issue costs one attachment download however many values are read
+_yaml_attachments = {}
+
+def find_yaml_attachment(issue):
     for attachment in issue.fields.attachment:
         if attachment.filename.endswith('.yaml'):
+            return attachment
+
+def get_yaml_attachment(issue):
+    import yaml
+    from yaml.loader import SafeLoader
+
+    if issue.key not in _yaml_attachments:
+        attachment = find_yaml_attachment(issue)
+        yaml_data = None
+        if attachment is not None:
             yaml_data = yaml.load(attachment.get(), Loader=SafeLoader)
-            return yaml_data
+        _yaml_attachments[issue.key] = yaml_data
+
+    return _yaml_attachments[issue.key]
 
 def get_jira_biosample(issue):
     yaml_data = get_yaml_attachment(issue)
@@ -27,58 +50,252 @@ def get_jira_species(issue):
     yaml_data = get_yaml_attachment(issue)
     return yaml_data["species"]
 
-def update_yaml(jira, issue, new_taxid, new_biosampleid):
+def with_retries(action, retries=3, backoff=1.0):
+    # Retry a Jira call with exponential backoff and jitter
+    for attempt in range(retries + 1):
+        try:
+            return action()
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(random.uniform(0, backoff * 2 ** attempt))
 
-    for attachment in issue.fields.attachment:
-        if attachment.filename.endswith('.yaml'):
-            yaml_data = yaml.load(attachment.get(), Loader=SafeLoader)
+def replace_yaml_attachment(jira, issue, attachment, yaml_data, retries=3):
+    """Replace an issue's .yaml attachment, serialised and uploaded from memory."""
+    import yaml
 
-            yaml_data["biosample"] = new_biosampleid
-            yaml_data["taxid"] = new_taxid
+    content = yaml.dump(yaml_data, default_flow_style=False).encode()
 
-            with open(attachment.filename, 'w') as w:
-                yaml.dump(yaml_data, w, default_flow_style=False)
+    def uploaded():
+        # Whether an earlier attempt whose response was lost already added the copy
+        current = jira.issue(issue.key, fields=ISSUE_FIELDS)
+        return any(other.filename == attachment.filename and other.id != attachment.id
+                   for other in current.fields.attachment)
 
+    attempted = False
 
+    def upload_new():
+        nonlocal attempted
+        if attempted and uploaded():
+            return
+        attempted = True
+        jira.add_attachment(issue=issue, attachment=io.BytesIO(content),
+                            filename=attachment.filename)
+
+    # Upload the new copy before deleting the old one, so a failure never
+    # leaves the issue without its yaml
+    with_retries(upload_new, retries)
+
+    def delete_old():
+        try:
             jira.delete_attachment(attachment.id)
+        except Exception as ex:
+            # Deleted by an earlier attempt whose response was lost
+            if getattr(ex, "status_code", None) != 404:
+                raise
 
-            with open(attachment.filename, 'rb') as r:
-                jira.add_attachment(issue=issue, attachment=r)
+    with_retries(delete_old, retries)
 
-def main():
-    # Find all open jira tickets with taxid and without biosampleid
+def update_yaml(jira, issue, new_taxid, new_biosampleid, retries=3):
 
-    tja = ToLJiraAuth()
-    jql_request = f"project = DS AND 'Species Name' ~ 'Wolbachia'"
-    # query to look for taxid_pending label
+    attachment = find_yaml_attachment(issue)
+    if attachment is None:
+        return
 
-    results = tja.auth_jira.search_issues(jql_request)
+    # Reuses the download made when reading the issue
+    yaml_data = get_yaml_attachment(issue)
 
-    fail_summary = {}
-    successes = {}
+    yaml_data["biosample"] = new_biosampleid
+    yaml_data["taxid"] = new_taxid
+
+    replace_yaml_attachment(jira, issue, attachment, yaml_data, retries)
+
+def scan_issues(jira, jql, page_size=50, after=None):
+    """Yield pages of the issues matching jql in key order, after issue key after.
+
+    Each page is requested with key > <last key seen>, so issues changed by
+    the scan (e.g. losing a label) never shift the pages still to come.
+    """
+    while True:
+        query = f"({jql})"
+        if after:
+            query += f" AND key > {after}"
+
+        page = jira.search_issues(query + " ORDER BY key ASC", startAt=0,
+                                  maxResults=page_size, fields=ISSUE_FIELDS)
+        if not page:
+            return
+
+        yield list(page)
+
+        # Jira may cap maxResults below page_size, so a short page is not
+        # the end. total counts the issues after the previous page, so this
+        # page was the last one when it held all of them.
+        total = getattr(page, "total", None)
+        if total is not None and len(page) >= total:
+            return
+        after = page[-1].key
+
+def default_checkpoint_file(jql):
+    # One file per query, so scans of different queries never share one
+    digest = hashlib.sha1(jql.encode()).hexdigest()[:12]
+    return f"check_jira_issues.{digest}.checkpoint"
+
+def read_checkpoint(checkpoint_file, jql):
+    """Last processed issue key of an interrupted scan of jql, if any.
+
+    A checkpoint written by a scan of another query is ignored.
+    """
+    if not os.path.exists(checkpoint_file):
+        return None
 
-    for result in results:
-        fails = []
-        issue = tja.auth_jira.issue(result)
+    with open(checkpoint_file) as r:
+        try:
+            checkpoint = json.load(r)
+        except ValueError:
+            return None
 
+    if not isinstance(checkpoint, dict) or checkpoint.get("jql") != jql:
+        print(f"Ignoring {checkpoint_file}, it was written by a scan of another query")
+        return None
+
+    return checkpoint.get("after")
+
+def write_checkpoint(checkpoint_file, jql, issue_key):
+    # Write then rename so no process ever reads a half-written checkpoint
+    tmp_file = f"{checkpoint_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w') as w:
+        json.dump({"jql": jql, "after": issue_key}, w)
+    os.replace(tmp_file, checkpoint_file)
+
+def get_page_species(issue):
+    try:
+        return get_jira_species(issue)
+    except Exception:
+        # Reported when the issue itself is processed
+        return None
+
+def process_issue(jira, issue, taxonomy, retries=3):
+    try:
         # if not get_jira_biosample(issue):
         # Check ENA for if taxid exists for sample
         species_name = get_jira_species(issue)
-        species_name = species_name.replace(" ","%20")
-        response = requests.get(f"https://www.ebi.ac.uk/ena/taxonomy/rest/scientific-name/{species_name}")
+        taxid = taxonomy.resolve_name(species_name)
+        if taxid is None:
+            raise Exception(f"Species '{species_name}' is not known to ENA taxonomy")
 
-        result = response.json()
-        result_dict = result[0]
         # Run biosample generation
-        taxid = result_dict["taxId"]
         print(taxid)
 
         # If ticket yaml has taxid and no biosample, submit to create one.
         # if not jira_biosample_id:
         #     if jira_taxid:
 
-        update_yaml(tja.auth_jira, issue, "test_biosample", taxid)
+        update_yaml(jira, issue, "test_biosample", taxid, retries)
         # remove taxid_pending label
 
+        return taxid
+    finally:
+        # Scanned issues are not read again, keep the cache small
+        _yaml_attachments.pop(issue.key, None)
+
+def process_pages(jira, pages, taxonomy, workers=4, checkpoint_file=None, retries=3,
+                  jql=None):
+    """Process issues concurrently as pages arrive, checkpointing each finished page.
+
+    The checkpoint records jql, the query the pages come from.
+
+    Attachment updates run in the same bounded pool, so up to workers
+    issues are uploading at once.
+    """
+    fail_summary = {}
+    successes = {}
+
+    def finish(page, futures):
+        for issue, future in zip(page, futures):
+            try:
+                successes[issue.key] = future.result()
+            except Exception as ex:
+                fail_summary[issue.key] = str(ex)
+
+        # Every issue up to the end of this page has been processed
+        if checkpoint_file:
+            write_checkpoint(checkpoint_file, jql, page[-1].key)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = None
+        for page in pages:
+            # Resolve the distinct species of the page in one batch
+            taxonomy.resolve_names(
+                species for species in executor.map(get_page_species, page) if species)
+
+            futures = [executor.submit(process_issue, jira, issue, taxonomy, retries)
+                       for issue in page]
+            if pending:
+                finish(*pending)
+            pending = (page, futures)
+
+        if pending:
+            finish(*pending)
+
+    return successes, fail_summary
+
+def main():
+    # Find all open jira tickets with taxid and without biosampleid
+
+    parser = optparse.OptionParser()
+    parser.add_option('-q', '--jql',
+                dest="jql",
+                default="project = DS AND labels = taxid_pending",
+                help="JQL filter selecting the issues to scan, without ORDER BY",
+                )
+    parser.add_option('-n', '--page-size',
+                dest="page_size",
+                type="int",
+                default=50,
+                help="Issues requested per search page",
+                )
+    parser.add_option('-w', '--workers',
+                dest="workers",
+                type="int",
+                default=4,
+                help="Issues processed concurrently",
+                )
+    parser.add_option('-r', '--retries',
+                dest="retries",
+                type="int",
+                default=3,
+                help="Retries of each Jira attachment upload and delete",
+                )
+    parser.add_option('-c', '--checkpoint',
+                dest="checkpoint",
+                help="File recording the last processed issue key, an interrupted scan "
+                     "resumes after it (default: check_jira_issues.<hash of the JQL>.checkpoint)",
+                )
+    (options, args) = parser.parse_args()
+    checkpoint_file = options.checkpoint or default_checkpoint_file(options.jql)
+
+    from enabiosamples.taxonomy_resolver import TaxonomyResolver
+
+    # Authenticates on first use, then every thread shares the client
+    tja = ToLJiraAuth(pool_maxsize=options.workers)
+    taxonomy = TaxonomyResolver()
+
+    after = read_checkpoint(checkpoint_file, options.jql)
+    if after:
+        print(f"Resuming scan after {after}")
+
+    pages = scan_issues(tja.auth_jira, options.jql, options.page_size, after)
+    successes, fail_summary = process_pages(tja.auth_jira, pages, taxonomy,
+                                            options.workers, checkpoint_file,
+                                            options.retries, options.jql)
+
+    for issue_key, error in fail_summary.items():
+        print(f"{issue_key} failed: {error}")
+
+    # The scan completed, so the next one starts from the beginning
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from enabiosamples.cache_files import default_cache_dir, read_json, write_json
+
+# Bump when the layout of the parsed checklist dict changes, so stale
+# entries written by an older version are ignored rather than misread.
+CHECKLIST_CACHE_VERSION = 1
+
+# fetch(checklist_id, etag) -> (fields, etag), or None if not modified
+ChecklistFetcher = Callable[
+    [str, Optional[str]], Optional[Tuple[Dict[str, list], Optional[str]]]
+]
+
+
+class ChecklistCache:
+    """Two level (process memory and on-disk json) cache of parsed checklists.
+
+    Entries are keyed by checklist ID and cache format version. Entries
+    older than ``ttl`` seconds are revalidated against ENA with the stored
+    ETag, so an unchanged checklist costs a 304 rather than a download and
+    re-parse. In offline mode only the disk cache is used.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        ttl: float = 7 * 24 * 60 * 60,
+        offline: bool = False,
+    ):
+        self.cache_dir = os.path.expanduser(
+            cache_dir or default_cache_dir("checklists")
+        )
+        self.ttl = ttl
+        self.offline = offline
+        self._memory: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict, offline: bool = False) -> "ChecklistCache":
+        settings = config.get("checklist_cache", {})
+
+        return cls(
+            cache_dir=settings.get("dir"),
+            ttl=settings.get("ttl", 7 * 24 * 60 * 60),
+            offline=offline,
+        )
+
+    def _path(self, checklist_id: str) -> str:
+        return os.path.join(
+            self.cache_dir, f"{checklist_id}.v{CHECKLIST_CACHE_VERSION}.json"
+        )
+
+    def _read(self, checklist_id: str) -> Optional[Dict]:
+        return read_json(self._path(checklist_id))
+
+    def _write(self, checklist_id: str, entry: Dict) -> None:
+        write_json(self._path(checklist_id), entry)
+
+    def get(self, checklist_id: str, fetch: ChecklistFetcher) -> Dict[str, list]:
+        with self._lock:
+            entry = self._memory.get(checklist_id)
+            if entry is not None:
+                return entry["fields"]
+
+            entry = self._read(checklist_id)
+
+            if self.offline:
+                if entry is None:
+                    raise Exception(
+                        f"Checklist {checklist_id} is not cached in {self.cache_dir} "
+                        "and offline checklists were requested"
+                    )
+            elif entry is None or time.time() - entry["fetched_at"] > self.ttl:
+                entry = self._refresh(checklist_id, entry, fetch)
+
+            self._memory[checklist_id] = entry
+            return entry["fields"]
+
+    def _refresh(
+        self, checklist_id: str, entry: Optional[Dict], fetch: ChecklistFetcher
+    ) -> Dict:
+        try:
+            fetched = fetch(checklist_id, entry["etag"] if entry else None)
+        except Exception:
+            # Fall back to a stale copy rather than fail the run
+            if entry is None:
+                raise
+            return entry
+
+        if fetched is None:
+            # 304 Not Modified - cached copy is still current
+            entry["fetched_at"] = time.time()
+        else:
+            fields, etag = fetched
+            entry = {"etag": etag, "fetched_at": time.time(), "fields": fields}
+
+        self._write(checklist_id, entry)
+        return entry
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+import re
+from typing import Any, Collection, Dict, List, Optional
+
+
+class ChecklistValidator:
+    """Validator compiled once from a parsed checklist.
+
+    Takes the output of EnaDataSource._convert_checklist_xml_to_dict, compiles
+    every restricted text regex and turns every text choice list into a
+    frozenset, so validating a batch costs one dict lookup per field.
+    """
+
+    def __init__(self, field_dict: Dict[str, Any]):
+        self.field_dict = field_dict
+        self.patterns = {}
+        self.choices = {}
+
+        for label, (_, field_type, constraint) in field_dict.items():
+            if field_type == "restricted text":
+                self.patterns[label] = re.compile(constraint)
+            elif field_type == "text choice":
+                self.choices[label] = frozenset(constraint)
+
+    def validate_sample(
+        self, sample: Dict[str, List], skip_fields: Collection[str] = ()
+    ) -> List[Dict[str, Any]]:
+        """Return the errors for one sample dict, empty if it is valid.
+
+        Fields in ``skip_fields`` are not checked.
+        """
+        errors = []
+
+        for key, val in sample.items():
+            if key in skip_fields:
+                continue
+
+            pattern = self.patterns.get(key)
+            if pattern is not None:
+                # ENA requires the whole value to match the checklist regex
+                if not pattern.fullmatch(str(val[0])):
+                    errors.append(
+                        {
+                            "field": key,
+                            "value": val[0],
+                            "type": "restricted text",
+                            "message": f"{key} is set to invalid '{val[0]}'. "
+                            f"Required regex is: {pattern.pattern}",
+                        }
+                    )
+                continue
+
+            choices = self.choices.get(key)
+            if choices is not None and val[0] not in choices:
+                errors.append(
+                    {
+                        "field": key,
+                        "value": val[0],
+                        "type": "text choice",
+                        "message": f"{key} is set to invalid option '{val[0]}'. "
+                        f"Valid options are: {self.field_dict[key][2]}",
+                    }
+                )
+
+        return errors
+
+    def validate(
+        self,
+        samples_dict: Dict[str, Dict[str, List]],
+        skip_fields: Collection[str] = (),
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Validate a batch of samples, returning errors keyed by sample title.
+
+        Samples that pass are not included in the result. Fields in
+        ``skip_fields`` (e.g. columns validate_frame already checked) are
+        not checked.
+        """
+        results = {}
+
+        for sample_key, sample in samples_dict.items():
+            errors = self.validate_sample(sample, skip_fields)
+            if errors:
+                results[sample_key] = errors
+
+        return results
+
+    def validate_frame(self, df, columns: Optional[List[str]] = None):
+        """Validate a polars DataFrame column by column.
+
+        Each checklist field that is a column of ``df`` (restricted to
+        ``columns`` if given) is checked as one expression over the whole
+        column. Returns an error frame with one row per failing value and
+        columns ``row``, ``field``, ``value`` and ``type``, where ``row`` is
+        the index of the failing row in ``df``.
+        """
+        import polars as pl
+
+        df = df.with_row_index("row")
+        fields = [
+            label
+            for label in self.field_dict
+            if label in df.columns and (columns is None or label in columns)
+        ]
+
+        error_frames = []
+        for label in fields:
+            mandatory, field_type, constraint = self.field_dict[label]
+            value = pl.col(label).cast(pl.String)
+
+            checks = []
+            if mandatory == "mandatory":
+                checks.append(("missing mandatory", value.is_null()))
+
+            if field_type == "restricted text":
+                checks.append(
+                    ("restricted text", self._regex_mismatch(label, value))
+                )
+            elif field_type == "text choice":
+                checks.append(
+                    ("text choice", value.is_not_null() & ~value.is_in(constraint))
+                )
+
+            for error_type, failed in checks:
+                error_frames.append(
+                    df.filter(failed).select(
+                        pl.col("row"),
+                        pl.lit(label).alias("field"),
+                        value.alias("value"),
+                        pl.lit(error_type).alias("type"),
+                    )
+                )
+
+        if not error_frames:
+            return pl.DataFrame(
+                schema={
+                    "row": pl.UInt32,
+                    "field": pl.String,
+                    "value": pl.String,
+                    "type": pl.String,
+                }
+            )
+
+        return pl.concat(error_frames).sort("row")
+
+    def _regex_mismatch(self, label: str, value):
+        import polars as pl
+
+        pattern = self.patterns[label]
+        try:
+            # Anchor as fullmatch does, using the native regex engine
+            regex = f"^(?:{pattern.pattern})$"
+            pl.select(pl.lit("").str.contains(regex))
+            matched = value.str.contains(regex)
+        except pl.exceptions.PolarsError:
+            # Checklist regex uses syntax polars does not support, fall back
+            # to the compiled Python pattern for this column only.
+            matched = value.map_elements(
+                lambda v: pattern.fullmatch(v) is not None, return_dtype=pl.Boolean
+            )
+
+        return value.is_not_null() & ~matched
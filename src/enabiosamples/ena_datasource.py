@@ -1,12 +1,31 @@
 #!/usr/bin/env python
 
+import copy
+import logging
 import uuid
-import datetime
-import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import xml.etree.ElementTree as ElementTree
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import requests
-from requests.auth import HTTPBasicAuth
+
+from enabiosamples.checklist_cache import ChecklistCache
+from enabiosamples.checklist_validator import ChecklistValidator
+from enabiosamples.ena_transport import EnaTransport
+from enabiosamples.run_journal import title_alias
+from enabiosamples.run_log import get_logger
+from enabiosamples.taxonomy_resolver import TaxonomyResolver
+
+
+class _ReiterableBody:
+    """Streamed request body rebuilt on each iteration, so it can be resent."""
+
+    def __init__(self, factory: Callable[[], Iterator[bytes]]):
+        self.factory = factory
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self.factory()
 
 
 class EnaDataSource:
@@ -40,7 +59,13 @@ class EnaDataSource:
 </ACTIONS>
 </SUBMISSION>"""
 
-    def __init__(self, config: Dict, debug: True):
+    def __init__(
+        self,
+        config: Dict,
+        debug: bool = False,
+        transport: Optional[EnaTransport] = None,
+        offline_checklists: bool = False,
+    ):
         self.get_uri = config["uri"]
 
         if config.get("set_uri", None):
@@ -52,21 +77,64 @@ class EnaDataSource:
         self.password = config["password"]
         self.contact_name = config["contact_name"]
         self.contact_email = config["contact_email"]
-        self.log_file = (
-            f"ena_datasource_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-        )
+        self.logger = get_logger("ena_datasource")
         self.debug = debug
 
-    def log(self, message):
-        file_obj = open(self.log_file, "a")
-        file_obj.write(f"{message}\n")
-        file_obj.close()
+        # One transport (and connection pool) is shared by every request
+        # made through this datasource for the whole run.
+        self.transport = transport or EnaTransport.from_config(config)
+        # Number of concurrent requests used when prefetching records
+        self.workers = config.get("workers", 4)
+
+        # Limits for splitting large submissions into separate SAMPLE_SETs
+        submission = config.get("submission", {})
+        self.submission_max_samples = submission.get("max_samples", 500)
+        self.submission_max_bytes = submission.get("max_bytes", 5_000_000)
+        self.submission_parallelism = submission.get("parallelism", 2)
+        # Stream the SAMPLE_SET sample by sample instead of building it whole
+        self.streaming_submissions = submission.get("streaming", False)
+        self.checklist_cache = ChecklistCache.from_config(
+            config, offline=offline_checklists
+        )
+        self._checklist_validators = {}
+
+        # Cached ENA taxonomy lookups, used to catch unknown taxon_ids
+        # before submission rather than in an ENA rejection receipt
+        self.taxonomy = TaxonomyResolver.from_config(
+            config, transport=self.transport
+        )
+        self.check_taxids = config.get("taxonomy", {}).get("check_taxids", True)
+
+        # LRU cache of parsed host biosample records, so rows that share a
+        # host only cost one ENA lookup.
+        self.biosample_cache_size = config.get("biosample_cache_size", 1024)
+        self._biosample_cache = OrderedDict()
+        self._biosample_cache_lock = threading.Lock()
+        self.biosample_cache_hits = 0
+        self.biosample_cache_misses = 0
+
+    def close(self) -> None:
+        self.transport.close()
+
+    def __enter__(self) -> "EnaDataSource":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def log(self, message, level: int = logging.INFO):
+        self.logger.log(level, message)
 
-    def post_request(self, command: str, files) -> requests.Response:
-        response = requests.post(
+    def post_request(
+        self, command: str, files=None, data=None, headers=None, retry=False
+    ) -> requests.Response:
+        # POSTs are only retried when the caller says resending is safe
+        response = self.transport.post(
             self.set_uri + command,
             files=files,
-            auth=HTTPBasicAuth(self.user, self.password),
+            data=data,
+            headers=headers,
+            retry=retry,
         )
         if response.status_code != 200:
             raise Exception(f"""Cannot connect to ENA (status code '{str(response.status_code)}').
@@ -75,9 +143,7 @@ class EnaDataSource:
         return response
 
     def get_request(self, command: str) -> requests.Response:
-        response = requests.get(
-            self.get_uri + command, auth=HTTPBasicAuth(self.user, self.password)
-        )
+        response = self.transport.get(self.get_uri + command)
 
         if response.status_code != 200:
             raise Exception(
@@ -89,47 +155,195 @@ class EnaDataSource:
     def get_xml_checklist(
         self, checklist_id: str
     ) -> Dict[str, Tuple[str, str, object]]:
-        output = self.get_request(f"/ena/browser/api/xml/{checklist_id}")
-        return self._convert_checklist_xml_to_dict(output.text)
+        return self.checklist_cache.get(checklist_id, self._fetch_xml_checklist)
+
+    def get_checklist_validator(self, checklist_id: str) -> ChecklistValidator:
+        """Return a validator for the checklist, compiled once per run."""
+        validator = self._checklist_validators.get(checklist_id)
+
+        if validator is None:
+            validator = ChecklistValidator(self.get_xml_checklist(checklist_id))
+            self._checklist_validators[checklist_id] = validator
+
+        return validator
+
+    def _fetch_xml_checklist(
+        self, checklist_id: str, etag: Optional[str]
+    ) -> Optional[Tuple[Dict[str, Tuple[str, str, object]], Optional[str]]]:
+        # Conditional fetch, returns None if the cached ETag is still current
+        headers = {"If-None-Match": etag} if etag else {}
+        response = self.transport.get(
+            self.get_uri + f"/ena/browser/api/xml/{checklist_id}", headers=headers
+        )
+
+        if response.status_code == 304:
+            return None
+
+        if response.status_code != 200:
+            raise Exception(
+                f"Cannot connect to ENA (status code '{str(response.status_code)}')'"
+            )
+
+        return (
+            self._convert_checklist_xml_to_dict(response.text),
+            response.headers.get("ETag"),
+        )
+
+    def unknown_taxids(self, samples: Dict[str, Dict]) -> Dict[str, str]:
+        """
+        The taxon_id of every sample, by title, that ENA taxonomy does not know.
+
+        Taxon_ids whose lookup failed are not reported, ENA still checks them
+        on submission.
+        """
+        if not self.check_taxids:
+            return {}
+
+        taxids = {
+            title: str(sample["taxon_id"][0]) for title, sample in samples.items()
+        }
+        known = self.taxonomy.check_taxids(taxids.values())
+
+        return {
+            title: taxid
+            for title, taxid in taxids.items()
+            if taxid in known and known[taxid] is None
+        }
 
     def get_biosample_data_biosampleid(self, biosample_id: str):
+        with self._biosample_cache_lock:
+            sample = self._biosample_cache.get(biosample_id)
+            if sample is not None:
+                self.biosample_cache_hits += 1
+                self._biosample_cache.move_to_end(biosample_id)
+
+        if sample is None:
+            sample = self._fetch_biosample_data(biosample_id)
+
+        # Callers modify the returned dict, so never hand out the cached one
+        return copy.deepcopy(sample)
+
+    def _map_concurrently(
+        self,
+        func: Callable,
+        items: List,
+        workers: Optional[int] = None,
+        on_error: Optional[Callable] = None,
+    ) -> List:
+        # Results are returned in the same order as items. With on_error,
+        # a failing item is passed to on_error(item, ex) and its result is
+        # None, instead of the error aborting the whole map.
+        if on_error is not None:
+            call = func
+
+            def func(item):
+                try:
+                    return call(item)
+                except Exception as ex:
+                    on_error(item, ex)
+                    return None
+
+        workers = workers or self.workers
+        if len(items) <= 1 or workers <= 1:
+            return [func(item) for item in items]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(func, items))
+
+    def prefetch_biosample_data(self, biosample_ids: Iterable[str]) -> None:
+        """
+        Fetch each unique, not yet cached, biosample once up front.
+
+        Failed fetches are logged and left uncached, so only the rows that
+        need that biosample fail when they look it up.
+        """
+        with self._biosample_cache_lock:
+            missing = [
+                biosample_id
+                for biosample_id in dict.fromkeys(biosample_ids)
+                if biosample_id not in self._biosample_cache
+            ]
+
+        self._map_concurrently(
+            self._fetch_biosample_data,
+            missing,
+            on_error=lambda biosample_id, ex: self.log(
+                f"Prefetch of biosample {biosample_id} failed: {ex}",
+                logging.WARNING,
+            ),
+        )
+
+    def biosample_cache_stats(self) -> str:
+        return (
+            f"Host biosample cache: {self.biosample_cache_hits} hits, "
+            f"{self.biosample_cache_misses} misses, "
+            f"{len(self._biosample_cache)} cached"
+        )
+
+    def _fetch_biosample_data(self, biosample_id: str):
         output = self.get_request(f"/ena/browser/api/xml/{biosample_id}")
         samples = self._convert_xml_to_list_of_sample_dict(output.text)
 
         # Only returning one sample for biosample
-        return samples[0]
+        sample = samples[0]
 
-    def generate_ena_ids_for_samples(
-        self, manifest_id: str, samples: Dict[str, Dict]
-    ) -> Tuple[str, Dict[str, Dict]]:
-        bundle_xml_file, sample_count = self._build_bundle_sample_xml(samples)
-
-        with open(bundle_xml_file, "r") as bxf:
-            bundle_xml_file_contents = bxf.read()
+        with self._biosample_cache_lock:
+            self.biosample_cache_misses += 1
+            self._biosample_cache[biosample_id] = sample
+            self._biosample_cache.move_to_end(biosample_id)
+            while len(self._biosample_cache) > self.biosample_cache_size:
+                self._biosample_cache.popitem(last=False)
 
-            element = ElementTree.XML(bundle_xml_file_contents)
-            ElementTree.indent(element)
-            bundle_xml_file_contents = ElementTree.tostring(element, encoding="unicode")
+        return sample
 
-        if sample_count == 0:
-            raise Exception("All samples have unknown taxonomy ID")
+    def generate_ena_ids_for_samples(
+        self,
+        manifest_id: str,
+        samples: Dict[str, Dict],
+        streaming: Optional[bool] = None,
+    ) -> Tuple[str, Dict[str, Dict]]:
+        if streaming is None:
+            streaming = self.streaming_submissions
 
-        submission_xml_file = self._build_submission_xml(
+        submission_xml = self._build_submission_xml(
             manifest_id, self.contact_name, self.contact_email
         )
 
-        xml_files = [
-            ("SAMPLE", open(bundle_xml_file, "rb")),
-            ("SUBMISSION", open(submission_xml_file, "rb")),
-        ]
-
-        response = self.post_request("/ena/submit/drop-box/submit/", xml_files)
+        if streaming:
+            response = self._post_streaming_bundle(manifest_id, samples, submission_xml)
+        else:
+            bundle_xml, sample_count = self._build_bundle_sample_xml(samples)
+
+            if sample_count == 0:
+                raise Exception("All samples have unknown taxonomy ID")
+
+            xml_files = [
+                (
+                    "SAMPLE",
+                    (f"bundle_{manifest_id}.xml", bundle_xml, "application/xml"),
+                ),
+                (
+                    "SUBMISSION",
+                    (
+                        f"submission_{manifest_id}.xml",
+                        submission_xml,
+                        "application/xml",
+                    ),
+                ),
+            ]
+
+            response = self.post_request(
+                "/ena/submit/drop-box/submit/",
+                xml_files,
+                retry=lambda: self._aliases_absent(samples),
+            )
 
         try:
             assigned_samples = self._assign_ena_ids(samples, response.text)
 
         except Exception as ex:
-            raise self.log(f"Error returned from ENA service: {ex}")
+            self.log(f"Error returned from ENA service: {ex}", logging.ERROR)
+            raise
 
         if not assigned_samples:
             errors = {}
@@ -145,6 +359,100 @@ class EnaDataSource:
         else:
             return True, assigned_samples
 
+    def generate_ena_ids_for_samples_in_chunks(
+        self,
+        samples: Dict[str, Dict],
+        max_samples: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        parallelism: Optional[int] = None,
+    ) -> Tuple[bool, Dict[str, Dict], List[Dict]]:
+        """
+        Submit samples as several size-capped SAMPLE_SETs, concurrently.
+
+        Returns overall success, the merged accessioned samples of every
+        successful chunk, and a report per chunk with keys ``chunk``,
+        ``success``, ``titles`` and ``errors``, so that only the titles of
+        failed chunks need resubmitting.
+        """
+        chunks = self._chunk_samples(
+            samples,
+            max_samples or self.submission_max_samples,
+            max_bytes or self.submission_max_bytes,
+        )
+
+        def submit_chunk(chunk: Dict[str, Dict]) -> Tuple[bool, Dict[str, Dict]]:
+            try:
+                return self.generate_ena_ids_for_samples(uuid.uuid4(), chunk)
+            except Exception as ex:
+                return False, {"1": str(ex)}
+
+        results = self._map_concurrently(
+            submit_chunk, chunks, workers=parallelism or self.submission_parallelism
+        )
+
+        assigned_samples = {}
+        chunk_reports = []
+        for i, (chunk, (success, result)) in enumerate(zip(chunks, results)):
+            if success:
+                assigned_samples.update(result)
+            else:
+                self.log(
+                    f"Submission of chunk {i} ({len(chunk)} samples) failed",
+                    logging.WARNING,
+                )
+
+            chunk_reports.append(
+                {
+                    "chunk": i,
+                    "success": success,
+                    "titles": list(chunk),
+                    "errors": {} if success else result,
+                }
+            )
+
+        all_success = all(report["success"] for report in chunk_reports)
+        return all_success, assigned_samples, chunk_reports
+
+    def _chunk_samples(
+        self, samples: Dict[str, Dict], max_samples: int, max_bytes: int
+    ) -> List[Dict[str, Dict]]:
+        return self._chunk_by_size(
+            samples,
+            lambda title, sample: len(
+                ElementTree.tostring(self._build_sample_element(title, sample))
+            ),
+            max_samples,
+            max_bytes,
+        )
+
+    def _chunk_by_size(
+        self,
+        items: Dict,
+        size_of: Callable,
+        max_samples: int,
+        max_bytes: int,
+    ) -> List[Dict]:
+        # Split by sample count and by the serialised size of each SAMPLE
+        chunks = []
+        chunk, chunk_bytes = {}, 0
+
+        for title, sample in items.items():
+            sample_bytes = size_of(title, sample)
+
+            if chunk and (
+                len(chunk) >= max_samples or chunk_bytes + sample_bytes > max_bytes
+            ):
+                chunks.append(chunk)
+                chunk, chunk_bytes = {}, 0
+
+            chunk[title] = sample
+            chunk_bytes += sample_bytes
+
+        if chunk:
+            chunks.append(chunk)
+
+        return chunks
+
     def _convert_checklist_xml_to_dict(
         self, checklist_xml: str
     ) -> Dict[str, Tuple[str, str, object]]:
@@ -251,87 +559,207 @@ class EnaDataSource:
 
     def _build_bundle_sample_xml(
         self, samples: Dict[str, Dict[str, List[str]]]
-    ) -> Tuple[str, int]:
-        """build structure and save to file bundle_file_subfix.xml"""
+    ) -> Tuple[bytes, int]:
+        """build the SAMPLE_SET in memory and return it serialised"""
 
-        manifest_id = uuid.uuid4()
+        root = ElementTree.fromstring(self.sample_xml_template)
 
-        dir_ = tempfile.TemporaryDirectory()
+        sample_count = self._update_bundle_sample_xml(samples, root)
 
-        filename = f"{dir_.name}bundle_{str(manifest_id)}.xml"
+        return ElementTree.tostring(root, encoding="UTF-8"), sample_count
 
-        with open(filename, "w") as sample_xml_file:
-            sample_xml_file.write(self.sample_xml_template)
+    def _iter_bundle_sample_xml(
+        self, samples: Iterable[Tuple[str, Dict[str, List[str]]]]
+    ) -> Iterator[bytes]:
+        """serialise the SAMPLE_SET one SAMPLE at a time"""
 
-        sample_count = self._update_bundle_sample_xml(samples, filename)
+        closing_tag = "</SAMPLE_SET>"
+        opening = self.sample_xml_template[
+            : self.sample_xml_template.rindex(closing_tag)
+        ]
 
-        return filename, sample_count
+        yield opening.encode("UTF-8")
+        for title, sample in samples:
+            sample_xml = ElementTree.tostring(
+                self._build_sample_element(title, sample), encoding="UTF-8"
+            )
+            if self.debug:
+                print(sample_xml.decode("UTF-8"))
+            yield sample_xml
+        yield closing_tag.encode("UTF-8")
+
+    def _post_streaming_bundle(
+        self, manifest_id: str, samples: Dict[str, Dict], submission_xml: bytes
+    ) -> requests.Response:
+        # Build the multipart body as a generator, so neither the SAMPLE_SET
+        # XML nor the request body is ever held in memory as a whole. Only
+        # the XML is streamed: samples itself stays in memory, since a retry
+        # rebuilds the body from it and the receipt is matched back to it.
+        if not samples:
+            raise Exception("All samples have unknown taxonomy ID")
+
+        boundary = uuid.uuid4().hex
+
+        def iter_body() -> Iterator[bytes]:
+            parts = [
+                (
+                    "SAMPLE",
+                    f"bundle_{manifest_id}.xml",
+                    self._iter_bundle_sample_xml(iter(samples.items())),
+                ),
+                ("SUBMISSION", f"submission_{manifest_id}.xml", [submission_xml]),
+            ]
+            return self._iter_multipart(parts, boundary)
+
+        return self.post_request(
+            "/ena/submit/drop-box/submit/",
+            data=_ReiterableBody(iter_body),
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+            retry=lambda: self._aliases_absent(samples),
+        )
+
+    def _aliases_absent(self, samples: Dict[str, Dict]) -> bool:
+        """
+        Whether no sample's alias is registered in the drop-box, so a failed
+        ADD submission can be resent without creating duplicate samples.
+        Anything but a 404 for every alias counts as possibly present.
+        """
+        found = self.find_submitted_aliases(list(samples))
+        absent = len(found) == len(samples) and not any(found.values())
+
+        if not absent:
+            self.log(
+                "Not resubmitting, some samples may already have reached ENA",
+                logging.WARNING,
+            )
+
+        return absent
+
+    def find_submitted_aliases(
+        self, titles: List[str]
+    ) -> Dict[str, Optional[Dict[str, List[str]]]]:
+        """
+        Look the alias of each sample title up in the drop-box, concurrently.
+
+        Returns, for every title whose lookup got an answer, the accessions
+        ENA holds for it (``biosample_accession`` and ``sra_accession``) or
+        None if the alias is not registered. Titles whose lookup failed are
+        left out.
+        """
+
+        def lookup(title: str):
+            try:
+                response = self.transport.get(
+                    self.set_uri
+                    + f"/ena/submit/drop-box/samples/{title_alias(title)}"
+                )
+            except requests.RequestException:
+                return title, False
+
+            if response.status_code == 404:
+                return title, None
+            if response.status_code != 200:
+                return title, False
+
+            try:
+                sample = ElementTree.fromstring(response.text)
+            except ElementTree.ParseError:
+                return title, False
+            if sample.tag != "SAMPLE":
+                sample = sample.find("SAMPLE")
+            if sample is None:
+                return title, False
+
+            return title, {
+                "sra_accession": [sample.get("accession"), None],
+                "biosample_accession": [
+                    sample.findtext(
+                        "IDENTIFIERS/EXTERNAL_ID[@namespace='BioSample']"
+                    ),
+                    None,
+                ],
+            }
+
+        return {
+            title: accessions
+            for title, accessions in self._map_concurrently(lookup, titles)
+            if accessions is not False
+        }
+
+    def _iter_multipart(
+        self, parts: List[Tuple[str, str, Iterable[bytes]]], boundary: str
+    ) -> Iterator[bytes]:
+        for name, filename, chunks in parts:
+            yield (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                "Content-Type: application/xml\r\n\r\n"
+            ).encode("UTF-8")
+            yield from chunks
+            yield b"\r\n"
+        yield f"--{boundary}--\r\n".encode("UTF-8")
+
+    def _build_sample_element(
+        self, title: str, sample: Dict[str, List[str]]
+    ) -> ElementTree.Element:
+        sample_alias = ElementTree.Element("SAMPLE")
+
+        sample_alias.set("alias", title_alias(title))
+        sample_alias.set("center_name", "SangerInstitute")
+
+        title_block = ElementTree.SubElement(sample_alias, "TITLE")
+        title_block.text = title
+        sample_name = ElementTree.SubElement(sample_alias, "SAMPLE_NAME")
+        taxon_id = ElementTree.SubElement(sample_name, "TAXON_ID")
+        taxon_id.text = str(sample["taxon_id"][0])
+        scientific_name = ElementTree.SubElement(sample_name, "SCIENTIFIC_NAME")
+        scientific_name.text = str(sample["scientific_name"][0])
+        sample_attributes = ElementTree.SubElement(sample_alias, "SAMPLE_ATTRIBUTES")
+
+        for key, val in sample.items():
+            if key in ["title", "taxon_id", "scientific_name"]:
+                continue
+
+            sample_attribute = ElementTree.SubElement(
+                sample_attributes, "SAMPLE_ATTRIBUTE"
+            )
+            tag = ElementTree.SubElement(sample_attribute, "TAG")
+            tag.text = key
+            value = ElementTree.SubElement(sample_attribute, "VALUE")
+            value.text = str(val[0])
+            # add ena units where necessary
+            if val[1]:
+                unit = ElementTree.SubElement(sample_attribute, "UNITS")
+                unit.text = val[1]
+
+        return sample_alias
 
     def _update_bundle_sample_xml(
-        self, samples: Dict[str, Dict[str, List[str]]], bundlefile: str
+        self, samples: Dict[str, Dict[str, List[str]]], root: ElementTree.Element
     ) -> int:
         """update the sample with submission alias adding a new sample"""
 
-        tree = ElementTree.parse(bundlefile)
-        root = tree.getroot()
         sample_count = 0
         for title, sample in samples.items():
             sample_count += 1
-            sample_alias = ElementTree.SubElement(root, "SAMPLE")
-
-            # Title is format <unique id>-<project name>-<specimen_type>
-            t_arr = title.split("-")
-
-            sample_alias.set(
-                "alias", f"{t_arr[0]}-{t_arr[1]}-{t_arr[2]}-{t_arr[3]}-{t_arr[4]}"
-            )
-            sample_alias.set("center_name", "SangerInstitute")
-
-            title_block = ElementTree.SubElement(sample_alias, "TITLE")
-            title_block.text = title
-            sample_name = ElementTree.SubElement(sample_alias, "SAMPLE_NAME")
-            taxon_id = ElementTree.SubElement(sample_name, "TAXON_ID")
-            taxon_id.text = str(sample["taxon_id"][0])
-            scientific_name = ElementTree.SubElement(sample_name, "SCIENTIFIC_NAME")
-            scientific_name.text = str(sample["scientific_name"][0])
-            sample_attributes = ElementTree.SubElement(
-                sample_alias, "SAMPLE_ATTRIBUTES"
-            )
-
-            for key, val in sample.items():
-                if key in ["title", "taxon_id", "scientific_name"]:
-                    continue
-
-                sample_attribute = ElementTree.SubElement(
-                    sample_attributes, "SAMPLE_ATTRIBUTE"
-                )
-                tag = ElementTree.SubElement(sample_attribute, "TAG")
-                tag.text = key
-                value = ElementTree.SubElement(sample_attribute, "VALUE")
-                value.text = str(val[0])
-                # add ena units where necessary
-                if val[1]:
-                    unit = ElementTree.SubElement(sample_attribute, "UNITS")
-                    unit.text = val[1]
+            root.append(self._build_sample_element(title, sample))
 
         if self.debug:
-            ElementTree.dump(tree)
-        tree.write(open(bundlefile, "w"), encoding="unicode")
+            ElementTree.dump(root)
         return sample_count
 
     def _build_submission_xml(
         self, manifest_id: str, contact_name: str, contact_email: str
-    ) -> str:
-        dir_ = tempfile.TemporaryDirectory()
-
-        submissionfile = f"{dir_.name}submission_{str(manifest_id)}.xml"
-
-        with open(submissionfile, "w") as submission_xml_file:
-            submission_xml_file.write(self.submission_xml_template)
+    ) -> bytes:
+        return self._build_contact_submission_xml(
+            self.submission_xml_template, contact_name, contact_email
+        )
 
+    def _build_contact_submission_xml(
+        self, template: str, contact_name: str, contact_email: str
+    ) -> bytes:
         # build submission XML
-        tree = ElementTree.parse(submissionfile)
-        root = tree.getroot()
+        root = ElementTree.fromstring(template)
 
         # set SRA contacts
         contacts = root.find("CONTACTS")
@@ -342,11 +770,9 @@ class EnaDataSource:
         copo_contact.set("inform_on_error", contact_email)
         copo_contact.set("inform_on_status", contact_email)
         if self.debug:
-            ElementTree.dump(tree)
+            ElementTree.dump(root)
 
-        tree.write(open(submissionfile, "w"), encoding="unicode")
-
-        return submissionfile
+        return ElementTree.tostring(root, encoding="UTF-8")
 
     def _assign_ena_ids(
         self, samples: str, xml: str
@@ -369,24 +795,46 @@ class EnaDataSource:
 
         assigned_samples = {}
 
+        # Index the submitted titles by alias once, so each receipt sample
+        # is matched exactly rather than by substring against every title.
+        alias_index = {title_alias(key): key for key in samples}
+        unmatched_receipts = []
+
         tree = ElementTree.fromstring(xml)
         submission_accession = tree.find("SUBMISSION").get("accession")
-        for child in tree.iter():
-            if child.tag == "SAMPLE":
-                sample_id = child.get("alias")
-                sra_accession = child.get("accession")
-                biosample_accession = child.find("EXT_ID").get("accession")
-
-                for key, sample_dict in samples.items():
-                    if sample_id in key:
-                        sample_dict["sra_accession"] = [sra_accession, None]
-                        sample_dict["biosample_accession"] = [biosample_accession, None]
-                        sample_dict["submission_accession"] = [
-                            submission_accession,
-                            None,
-                        ]
-
-                        assigned_samples[key] = sample_dict
+        for child in tree.iter("SAMPLE"):
+            sample_id = child.get("alias")
+            key = alias_index.get(sample_id)
+
+            if key is None:
+                unmatched_receipts.append(sample_id)
+                continue
+
+            sra_accession = child.get("accession")
+            ext_id_node = child.find("EXT_ID")
+            biosample_accession = (
+                ext_id_node.get("accession") if ext_id_node is not None else None
+            )
+
+            sample_dict = samples[key]
+            sample_dict["sra_accession"] = [sra_accession, None]
+            sample_dict["biosample_accession"] = [biosample_accession, None]
+            sample_dict["submission_accession"] = [submission_accession, None]
+
+            assigned_samples[key] = sample_dict
+
+        unmatched_samples = [key for key in samples if key not in assigned_samples]
+
+        if unmatched_receipts:
+            self.log(
+                f"Receipt samples not matching any submitted sample: {unmatched_receipts}",
+                logging.WARNING,
+            )
+        if unmatched_samples:
+            self.log(
+                f"Submitted samples missing from receipt: {unmatched_samples}",
+                logging.WARNING,
+            )
 
         return assigned_samples
 
@@ -395,57 +843,239 @@ class EnaDataSource:
 
         return output.text
 
+    def get_existing_samples_data(
+        self, accessions: List[str], on_error: Optional[Callable] = None
+    ) -> List[Optional[str]]:
+        """
+        Fetch the drop-box XML of many samples concurrently, in input order.
+
+        With on_error, a failed fetch calls on_error(accession, ex) and
+        gives None instead of raising.
+        """
+        return self._map_concurrently(
+            self.get_existing_sample_data, list(accessions), on_error=on_error
+        )
+
+    def sample_attributes(self, sample_xml) -> Dict[str, str]:
+        """TAG to VALUE of the SAMPLE_ATTRIBUTES of a drop-box record."""
+        root = (
+            ElementTree.fromstring(sample_xml)
+            if isinstance(sample_xml, (str, bytes))
+            else sample_xml
+        )
+
+        return {
+            attribute.findtext("TAG"): attribute.findtext("VALUE") or ""
+            for attribute in root.iter("SAMPLE_ATTRIBUTE")
+        }
+
+    def diff_sample_attributes(
+        self, before: Dict[str, str], after: Dict[str, str]
+    ) -> List[Tuple[str, Optional[str], Optional[str]]]:
+        """(tag, before, after) for every attribute added, removed or changed."""
+        return [
+            (tag, before.get(tag), after.get(tag))
+            for tag in {**before, **after}
+            if before.get(tag) != after.get(tag)
+        ]
+
+    def verify_updated_samples(
+        self, samples: Dict[str, object]
+    ) -> Dict[str, Optional[List[Tuple[str, Optional[str], Optional[str]]]]]:
+        """
+        Re-fetch updated records concurrently and check what we sent was applied.
+
+        Takes the submitted records keyed by accession, as given to
+        update_existing_samples. Returns, per accession, the sent attributes
+        ENA holds a different value for as (tag, sent, found), so an empty
+        list means the update was applied, or None if the record could not
+        be re-fetched.
+        """
+        accessions = list(samples)
+        fetched = self._map_concurrently(
+            self.get_existing_sample_data,
+            accessions,
+            on_error=lambda accession, ex: self.log(
+                f"Verification fetch of {accession} failed: {ex}", logging.WARNING
+            ),
+        )
+
+        mismatches = {}
+        for accession, fetched_xml in zip(accessions, fetched):
+            if fetched_xml is None:
+                mismatches[accession] = None
+                continue
+
+            sent = self.sample_attributes(samples[accession])
+            try:
+                found = self.sample_attributes(fetched_xml)
+            except ElementTree.ParseError:
+                found = {}
+
+            mismatches[accession] = [
+                (tag, sent_value, found.get(tag))
+                for tag, sent_value in sent.items()
+                if found.get(tag) != sent_value
+            ]
+
+        return mismatches
+
     def get_accession_from_biosampleid(self, biosampleid: str):
         output = self.get_request(f"/biosamples/samples/{biosampleid}")
 
         return output.text
 
     def update_existing_xml(self, manifest_id: str, updated_xml):
-        dir_ = tempfile.TemporaryDirectory()
-
-        updatedxmlfile = f"{dir_.name}submission_{str(manifest_id)}.xml"
+        if isinstance(updated_xml, str):
+            updated_xml = updated_xml.encode("UTF-8")
 
-        with open(updatedxmlfile, "w") as updated_xml_file:
-            updated_xml_file.write(updated_xml)
-
-        updated_submission_xml_file = self._build_update_xml(
+        update_submission_xml = self._build_update_xml(
             manifest_id, self.contact_name, self.contact_email
         )
 
         xml_files = [
-            ("SAMPLE", open(updatedxmlfile, "rb")),
-            ("SUBMISSION", open(updated_submission_xml_file, "rb")),
+            ("SAMPLE", (f"sample_{manifest_id}.xml", updated_xml, "application/xml")),
+            (
+                "SUBMISSION",
+                (
+                    f"submission_{manifest_id}.xml",
+                    update_submission_xml,
+                    "application/xml",
+                ),
+            ),
         ]
 
-        response = self.post_request("/ena/submit/drop-box/submit/", xml_files)
+        # Resending a MODIFY leaves the records as a single one would
+        response = self.post_request(
+            "/ena/submit/drop-box/submit/", xml_files, retry=True
+        )
 
-        return updatedxmlfile, updated_submission_xml_file, response.text
+        return updated_xml, update_submission_xml, response.text
+
+    def update_existing_samples(
+        self,
+        samples: Dict[str, ElementTree.Element],
+        max_samples: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        parallelism: Optional[int] = None,
+    ) -> Tuple[bool, Dict[str, str], List[Dict]]:
+        """
+        Submit many modified drop-box records as bulk MODIFY submissions.
+
+        Takes modified records keyed by accession, each either the SAMPLE_SET
+        root parsed from get_existing_sample_data or its SAMPLE element. The
+        SAMPLE elements are merged into SAMPLE_SETs capped like new
+        submissions, each sent with one MODIFY action, and every receipt is
+        read per sample.
+
+        Returns overall success, "success" or "failed: <reason>" for each
+        accession, and a report per chunk with keys ``chunk``, ``success``,
+        ``accessions`` and ``errors``.
+        """
+        elements = {
+            accession: root if root.tag == "SAMPLE" else root.find("SAMPLE")
+            for accession, root in samples.items()
+        }
+
+        chunks = self._chunk_by_size(
+            elements,
+            lambda accession, element: len(ElementTree.tostring(element)),
+            max_samples or self.submission_max_samples,
+            max_bytes or self.submission_max_bytes,
+        )
 
-    def _build_update_xml(
-        self, manifest_id: str, contact_name: str, contact_email: str
-    ) -> str:
-        dir_ = tempfile.TemporaryDirectory()
+        results = self._map_concurrently(
+            self._submit_update_chunk,
+            chunks,
+            workers=parallelism or self.submission_parallelism,
+        )
 
-        submissionfile = f"{dir_.name}submission_{str(manifest_id)}.xml"
+        update_results = {}
+        chunk_reports = []
+        for i, (chunk, (success, chunk_results)) in enumerate(zip(chunks, results)):
+            update_results.update(chunk_results)
 
-        with open(submissionfile, "w") as submission_xml_file:
-            submission_xml_file.write(self.update_xml_template)
+            if not success:
+                self.log(
+                    f"Update of chunk {i} ({len(chunk)} samples) failed",
+                    logging.WARNING,
+                )
 
-        # build submission XML
-        tree = ElementTree.parse(submissionfile)
-        root = tree.getroot()
+            chunk_reports.append(
+                {
+                    "chunk": i,
+                    "success": success,
+                    "accessions": list(chunk),
+                    "errors": {
+                        accession: result
+                        for accession, result in chunk_results.items()
+                        if result != "success"
+                    },
+                }
+            )
 
-        # set SRA contacts
-        contacts = root.find("CONTACTS")
+        all_success = all(report["success"] for report in chunk_reports)
+        return all_success, update_results, chunk_reports
 
-        # set copo sra contacts
-        copo_contact = ElementTree.SubElement(contacts, "CONTACT")
-        copo_contact.set("name", contact_name)
-        copo_contact.set("inform_on_error", contact_email)
-        copo_contact.set("inform_on_status", contact_email)
-        if self.debug:
-            ElementTree.dump(tree)
+    def _submit_update_chunk(
+        self, chunk: Dict[str, ElementTree.Element]
+    ) -> Tuple[bool, Dict[str, str]]:
+        sample_set = ElementTree.fromstring(self.sample_xml_template)
+        sample_set.extend(chunk.values())
 
-        tree.write(open(submissionfile, "w"), encoding="unicode")
+        try:
+            _, _, receipt = self.update_existing_xml(
+                uuid.uuid4(), ElementTree.tostring(sample_set, encoding="UTF-8")
+            )
+        except Exception as ex:
+            return False, {accession: f"failed: {ex}" for accession in chunk}
+
+        self.log(f"Update receipt: {receipt}", logging.DEBUG)
 
-        return submissionfile
+        return self._read_update_receipt(chunk, receipt)
+
+    def _read_update_receipt(
+        self, chunk: Dict[str, ElementTree.Element], receipt: str
+    ) -> Tuple[bool, Dict[str, str]]:
+        try:
+            tree = ElementTree.fromstring(receipt)
+        except ElementTree.ParseError:
+            return False, {accession: "failed: unreadable receipt" for accession in chunk}
+
+        # ENA applies a submission all or nothing, so a rejected receipt
+        # fails every sample in the chunk with the receipt's errors
+        if tree.get("success") != "true":
+            reason = "; ".join(
+                error.text for error in tree.iter("ERROR") if error.text
+            )
+            return False, {
+                accession: f"failed: {reason or 'submission rejected'}"
+                for accession in chunk
+            }
+
+        # Receipt samples carry the SRA accession, alias and biosample ID
+        receipt_ids = set()
+        for receipt_sample in tree.iter("SAMPLE"):
+            receipt_ids.update(
+                [receipt_sample.get("accession"), receipt_sample.get("alias")]
+            )
+            receipt_ids.update(
+                ext_id.get("accession") for ext_id in receipt_sample.iter("EXT_ID")
+            )
+        receipt_ids.discard(None)
+
+        results = {}
+        for accession, element in chunk.items():
+            ids = {accession, element.get("accession"), element.get("alias")}
+            results[accession] = (
+                "success" if ids & receipt_ids else "failed: missing from receipt"
+            )
+
+        return all(result == "success" for result in results.values()), results
+
+    def _build_update_xml(
+        self, manifest_id: str, contact_name: str, contact_email: str
+    ) -> bytes:
+        return self._build_contact_submission_xml(
+            self.update_xml_template, contact_name, contact_email
+        )
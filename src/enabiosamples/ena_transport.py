@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+
+import email.utils
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from enabiosamples.run_log import get_logger
+
+# Methods retried automatically, repeating them cannot change ENA's state
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS"])
+# Statuses ENA returns while overloaded or briefly unavailable
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+class RateLimiter:
+    """Thread safe limiter spacing requests evenly to stay under a quota."""
+
+    def __init__(self, max_per_second: Optional[float]):
+        self.interval = 1.0 / max_per_second if max_per_second else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class CircuitBreaker:
+    """Thread safe breaker pausing every caller while ENA is degraded.
+
+    After failure_threshold consecutive failed requests the breaker opens
+    and every thread sharing it waits out the cooldown before its next
+    request. Once it has passed a single further failure reopens it, while
+    any success closes it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._open_until > time.monotonic()
+
+    def wait(self) -> None:
+        with self._lock:
+            delay = self._open_until - time.monotonic()
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+
+    def record_failure(self) -> bool:
+        """Count a failure, returning True if it opened the breaker."""
+        if not self.failure_threshold:
+            return False
+
+        with self._lock:
+            self._failures += 1
+            if self._failures < self.failure_threshold:
+                return False
+
+            self._open_until = time.monotonic() + self.cooldown
+            # Half open: the first failure after the cooldown reopens it
+            self._failures = self.failure_threshold - 1
+            return True
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, honouring Retry-After up to backoff_max."""
+
+    def __init__(
+        self,
+        max_retries: int = 4,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        retry_after = self._retry_after(response) if response is not None else None
+        if retry_after is not None:
+            # A far-off Retry-After must not stall every worker sharing the breaker
+            return min(self.backoff_max, retry_after)
+
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2**attempt)
+        )
+
+    def _retry_after(self, response: requests.Response) -> Optional[float]:
+        # Retry-After is either a number of seconds or an HTTP date
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+
+        return max(0.0, retry_at.timestamp() - time.time())
+
+
+class EnaTransport:
+    """Pooled, keep-alive HTTP transport shared by everything talking to ENA.
+
+    A single requests.Session is kept for the lifetime of the transport so
+    TCP/TLS connections are reused across host lookups, checklist fetches
+    and drop-box submissions instead of being re-established per call.
+    """
+
+    def __init__(
+        self,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        pool_connections: int = 4,
+        pool_maxsize: int = 10,
+        pool_block: bool = True,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 300.0,
+        max_requests_per_second: Optional[float] = 10.0,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+    ):
+        # pool_connections is the number of per-host pools kept alive,
+        # pool_maxsize the number of connections kept per host and
+        # pool_block caps concurrent connections to a host at pool_maxsize.
+        self.timeout = (connect_timeout, read_timeout)
+        self.rate_limiter = RateLimiter(max_requests_per_second)
+        # Shared by every worker, so an open breaker pauses them all
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.logger = get_logger("transport")
+
+        self.session = requests.Session()
+        if user is not None:
+            self.session.auth = (user, password)
+        self.session.headers.update({"Connection": "keep-alive"})
+
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "EnaTransport":
+        """Build a transport from the ``credentials`` block of the API json.
+
+        Connection settings are optional and may be given under a
+        ``transport`` key, e.g. ``{"pool_maxsize": 20, "read_timeout": 600}``.
+        Retry and circuit breaker settings go under the same key.
+        """
+        settings = config.get("transport", {})
+
+        return cls(
+            user=config["user"],
+            password=config["password"],
+            pool_connections=settings.get("pool_connections", 4),
+            pool_maxsize=settings.get("pool_maxsize", 10),
+            pool_block=settings.get("pool_block", True),
+            connect_timeout=settings.get("connect_timeout", 10.0),
+            read_timeout=settings.get("read_timeout", 300.0),
+            max_requests_per_second=settings.get("max_requests_per_second", 10.0),
+            retry_policy=RetryPolicy(
+                max_retries=settings.get("max_retries", 4),
+                backoff_base=settings.get("backoff_base", 1.0),
+                backoff_max=settings.get("backoff_max", 60.0),
+            ),
+            circuit_breaker=CircuitBreaker(
+                failure_threshold=settings.get("circuit_failures", 5),
+                cooldown=settings.get("circuit_cooldown", 30.0),
+            ),
+        )
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        retry: Union[None, bool, Callable[[], bool]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        Send a request, retrying timeouts, connection errors and RETRY_STATUSES.
+
+        Idempotent methods are retried by default and others are not. retry
+        may instead be True, False, or a callable asked before each retry
+        whether resending is safe. Once retries run out the last response is
+        returned for the caller to handle, or the last connection error raised.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        if retry is None:
+            retry = method.upper() in IDEMPOTENT_METHODS
+
+        attempt = 0
+        while True:
+            self.circuit_breaker.wait()
+            self.rate_limiter.wait()
+
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as ex:
+                response, failure = None, ex
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self.circuit_breaker.record_success()
+                    return response
+                failure = f"status code {response.status_code}"
+
+            if self.circuit_breaker.record_failure():
+                self.logger.warning(
+                    f"ENA looks degraded, pausing requests for "
+                    f"{self.circuit_breaker.cooldown}s"
+                )
+
+            if attempt >= self.retry_policy.max_retries or not (
+                retry() if callable(retry) else retry
+            ):
+                if response is None:
+                    raise failure
+                return response
+
+            delay = self.retry_policy.delay(attempt, response)
+            attempt += 1
+            self.logger.warning(
+                f"{method} {url} failed ({failure}), "
+                f"retry {attempt} of {self.retry_policy.max_retries} in {delay:.1f}s"
+            )
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "EnaTransport":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
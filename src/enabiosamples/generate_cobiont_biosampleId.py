@@ -1,24 +1,17 @@
 #!/usr/bin/env python
 
-import pandas as pd
-import uuid
+import csv
 import optparse
 import datetime
-import re
 import json
-import tempfile
-import uuid
-import xml.etree.ElementTree as ElementTree
-from typing import Dict, List, Tuple
-import requests
-from requests.auth import HTTPBasicAuth
-from ena_datasource import EnaDataSource
-
-def log(message):
-    curr_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    file_obj = open(log_file, 'a')
-    file_obj.write(f"({curr_time}) {message}\n")
-    file_obj.close()
+import logging
+from enabiosamples.run_journal import RunJournal, stable_sample_uuid
+from enabiosamples.run_log import configure_run_logging, get_logger
+
+logger = get_logger("cobiont")
+
+def log(message, level=logging.INFO):
+    logger.log(level, message)
 
 def copy_checklist_items(field_dict, parent_dict, child_dict):
     for parent_key, parent_val in parent_dict.items():
@@ -54,55 +47,32 @@ def copy_checklist_items(field_dict, parent_dict, child_dict):
                 optional_missing.append(field_key)
 
     if mandatory_missing:
-        log("Missing mandatory fields:")
-        for field in mandatory_missing:
-            log(field)
+        log(f"Missing mandatory fields: {', '.join(mandatory_missing)}", logging.WARNING)
 
     return child_dict
 
-def validate_samples_with_checklist(field_dict, samples_dict):
-
-    invalid_text = []
-    invalid_option = []
+def validate_samples_with_checklist(validator, samples_dict):
 
-    validation_status = True
+    validation_errors = validator.validate(samples_dict)
 
-    for sample_key, sample_val in samples_dict.items():
-        value_dict = sample_val
-        invalid_text = []
-        invalid_option = []
-        for value_key, value_val in value_dict.items():
+    for sample_key, errors in validation_errors.items():
+        sample_val = samples_dict[sample_key]
+        log(f"Validation failed for {sample_key} - {sample_val['taxon_id'][0]} - "
+            f"{sample_val['tolid'][0]}: " + "; ".join(error['message'] for error in errors),
+            logging.WARNING)
 
-            if value_key in field_dict.keys():
+    return not validation_errors
 
-                if field_dict[value_key][1] == 'restricted text':
-                    pattern = re.compile(field_dict[value_key][2])
+def check_taxids(ena_datasource, samples_dict):
 
-                    if not pattern.match(str(value_val[0])):
-                        invalid_text.append(f"""   {value_key} is set to invalid '{value_val[0]}'. 
-                                            Required regex is: {field_dict[value_key][2]}""")
+    unknown_taxids = ena_datasource.unknown_taxids(samples_dict)
 
-                elif field_dict[value_key][1] == 'text choice':
-                    if value_val[0] not in field_dict[value_key][2]:
-                        invalid_option.append(f"""   {value_key} is set to invalid option 
-                                '{value_val[0]}'. Valid options are: {field_dict[value_key][2]}""")
+    for sample_key, taxid in unknown_taxids.items():
+        log(f"Validation failed for {sample_key} - {taxid} - "
+            f"{samples_dict[sample_key]['tolid'][0]}: cobiont_taxid is not known to ENA taxonomy",
+            logging.WARNING)
 
-        if invalid_text or invalid_option:
-            log("================")
-            log(f"{sample_key} - {sample_val['taxon_id'][0]} - {sample_val['tolid'][0]}")
-            for field in invalid_text:
-                log(field)
-            for field in invalid_option:
-                log(field)
-            log("================")
-
-        if invalid_text:
-            validation_status = False
-
-        if invalid_option:
-            validation_status = False
-    
-    return validation_status
+    return not unknown_taxids
 
 def main():
 
@@ -123,98 +93,196 @@ def main():
             dest="output",
             default="",
             ) 
+    parser.add_option('-v', '--verbosity',
+            dest="verbosity",
+            default="INFO",
+            help="Minimum level of messages written to the log file",
+            )
+    parser.add_option('--log-format',
+            dest="log_format",
+            choices=["json", "text"],
+            default="json",
+            help="Write the log as JSON lines or as plain text",
+            )
+    parser.add_option('--run-id',
+            dest="run_id",
+            default=None,
+            help="Correlation ID stamped on every log line",
+            )
+    parser.add_option('-j', '--journal',
+            dest="journal",
+            default=None,
+            help="SQLite run journal; cobionts already accessioned in it are skipped",
+            )
+    parser.add_option('--offline-checklists',
+            dest="offline_checklists",
+            action="store_true",
+            default=False,
+            help="Only use checklists from the local checklist cache",
+            )
 
     (options, args) = parser.parse_args()
 
+    # Imported after parsing so --help does not load the ENA client
+    from ena_datasource import EnaDataSource
+
     global project_name
     project_name = options.proj
 
     output_file_name = options.output
 
-    global log_file 
     log_file = f'cobiont_{project_name}_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}.txt'
+    configure_run_logging(log_file, run_id=options.run_id, verbosity=options.verbosity,
+                          json_lines=options.log_format == "json")
 
     with open(options.api) as json_file:
         enviromment_params = json.load(json_file)
 
     # Check connection to local tol-sdk
-    ena_datasource = EnaDataSource(enviromment_params['credentials'])
-
-    # Import cobiont csv
-    df_cobionts = pd.read_csv(options.data)
-
-    primary_samples_dict = {}
-
-    tol_validation_passed = True
-
-    # Currently provided inputs: host_biospecimen,cobiont_taxname,cobiont_taxid
-
-    for index, cobiont in df_cobionts.iterrows():
-
-        # Get Host data from ENA
-        host_sample_dict = ena_datasource.get_biosample_data_biosampleid(cobiont["host_biospecimen"])
-
-        cobiont_uuid = f"{uuid.uuid4()}-{project_name}-cobiont"
-
-        # Create cobiont sample dictionary
-        cobiont_dict = {
-            'title': [cobiont_uuid, None],
-            'taxon_id': [cobiont["cobiont_taxid"], None],
-            'scientific_name': [cobiont["cobiont_taxname"], None],
-            'host scientific name': host_sample_dict["scientific_name"],
-            'host taxid': host_sample_dict["taxon_id"],
-            'ENA-CHECKLIST': ['ERC000053', None],
-            'tolid': [cobiont["cobiont_tolid"], None],
-            'common name': ["", None],
-            'sex': ["NOT_COLLECTED", None],
-            'lifestage': ["NOT_COLLECTED", None],
-            'symbiont': ['Y', None],
-            'sample symbiont of': [cobiont["host_biospecimen"], None]
-        }
-
-        log("Check TOL checklist")
-        tol_field_dict = ena_datasource.get_xml_checklist('ERC000053')
-
-        log("Copy checklist items")
-        # Copy extra host fields, extract data from fields required to populate tol checklist
-        primary_sample_dict = copy_checklist_items(tol_field_dict, host_sample_dict, cobiont_dict)
-
-        # Add to sample list
-        primary_samples_dict[cobiont_uuid] = primary_sample_dict
-
-    # Validate
-    log("Validate checklist items")
-    tol_validation_passed = validate_samples_with_checklist(tol_field_dict, primary_samples_dict)
-
-        # Check validation - if fails do not submit:
-    if tol_validation_passed:
+    ena_datasource = EnaDataSource(enviromment_params['credentials'],
+                                   offline_checklists=options.offline_checklists)
+
+    journal = None
+    try:
+        # Import cobiont csv
+        # utf-8-sig drops the byte order mark of CSVs exported from Excel
+        with open(options.data, encoding='utf-8-sig', newline='') as csv_file:
+            cobionts = list(csv.DictReader(csv_file))
+
+        primary_samples_dict = {}
+
+        tol_validation_passed = True
+
+        # Currently provided inputs: host_biospecimen,cobiont_taxname,cobiont_taxid
+
+        # Titles are derived from the ToLID, so a rerun reuses the same aliases
+        for cobiont in cobionts:
+            cobiont['title'] = (f"{stable_sample_uuid(project_name, 'cobiont', cobiont['cobiont_tolid'])}"
+                                f"-{project_name}-cobiont")
+
+        # Skip cobionts a previous run already accessioned
+        if options.journal:
+            journal = RunJournal(options.journal)
+        done_samples_dict = {}
+        if journal:
+            done_samples_dict, _ = journal.split_accessioned({
+                cobiont['title']: {'tolid': [cobiont['cobiont_tolid'], None]}
+                for cobiont in cobionts}, ena_datasource.find_submitted_aliases)
+            cobionts = [cobiont for cobiont in cobionts if cobiont['title'] not in done_samples_dict]
+            log(f"Skipping {len(done_samples_dict)} cobionts already accessioned in journal")
+
+        # Fetch each host once, however many cobionts share it
+        ena_datasource.prefetch_biosample_data([cobiont["host_biospecimen"] for cobiont in cobionts])
+
+        host_lookup_passed = True
+
+        for cobiont in cobionts:
+
+            # Get Host data from ENA, a bad host only fails its own cobionts
+            try:
+                host_sample_dict = ena_datasource.get_biosample_data_biosampleid(cobiont["host_biospecimen"])
+            except Exception as ex:
+                log(f"Validation failed for {cobiont['title']} - {cobiont['cobiont_tolid']}: "
+                    f"cannot fetch host {cobiont['host_biospecimen']}: {ex}", logging.ERROR)
+                host_lookup_passed = False
+                continue
 
-        # Submit manifest of all primary metagenomes.
-        ## Submit to Enadatasource,
-        ## 1. converts to xml, (creates sample id - UUID)
-        ## 2. submits to ena
-        ## 3. intepret response xml, appends biosampleid to sample dict
-        log("Generate ENA IDs for primary samples")
-        primary_submission_success, primary_submission_dict = ena_datasource.generate_ena_ids_for_samples(uuid.uuid4(), primary_samples_dict)
+            cobiont_uuid = cobiont['title']
+
+            # Create cobiont sample dictionary
+            cobiont_dict = {
+                'title': [cobiont_uuid, None],
+                'taxon_id': [cobiont["cobiont_taxid"], None],
+                'scientific_name': [cobiont["cobiont_taxname"], None],
+                'host scientific name': host_sample_dict["scientific_name"],
+                'host taxid': host_sample_dict["taxon_id"],
+                'ENA-CHECKLIST': ['ERC000053', None],
+                'tolid': [cobiont["cobiont_tolid"], None],
+                'common name': ["", None],
+                'sex': ["NOT_COLLECTED", None],
+                'lifestage': ["NOT_COLLECTED", None],
+                'symbiont': ['Y', None],
+                'sample symbiont of': [cobiont["host_biospecimen"], None]
+            }
+
+            log("Check TOL checklist")
+            tol_field_dict = ena_datasource.get_xml_checklist('ERC000053')
+
+            log("Copy checklist items")
+            # Copy extra host fields, extract data from fields required to populate tol checklist
+            primary_sample_dict = copy_checklist_items(tol_field_dict, host_sample_dict, cobiont_dict)
+
+            # Add to sample list
+            primary_samples_dict[cobiont_uuid] = primary_sample_dict
+
+        # Validate
+        log("Validate checklist items")
+        tol_validation_passed = validate_samples_with_checklist(
+            ena_datasource.get_checklist_validator('ERC000053'), primary_samples_dict) and host_lookup_passed
+
+        # Every distinct cobiont_taxid is looked up once, concurrently
+        log("Check cobiont taxids")
+        tol_validation_passed = check_taxids(ena_datasource, primary_samples_dict) and tol_validation_passed
+
+            # Check validation - if fails do not submit:
+        primary_submission_dict = {}
+        if tol_validation_passed and primary_samples_dict:
+
+            # Submit manifest of all primary metagenomes.
+            ## Submit to Enadatasource,
+            ## 1. converts to xml, (creates sample id - UUID)
+            ## 2. submits to ena
+            ## 3. intepret response xml, appends biosampleid to sample dict
+            log("Generate ENA IDs for primary samples")
+            if journal:
+                journal.record_pending(primary_samples_dict, "cobiont")
+
+            primary_submission_success, primary_submission_dict, chunk_reports = (
+                ena_datasource.generate_ena_ids_for_samples_in_chunks(primary_samples_dict))
+
+            if journal:
+                journal.record_submitted(primary_submission_dict)
+
+            for report in chunk_reports:
+                if not report["success"]:
+                    if journal:
+                        journal.record_failed(report["titles"])
+                    log(f"ENA generation failed for chunk {report['chunk']}:", logging.ERROR)
+                    log(", ".join(report["titles"]), logging.ERROR)
+                    for val in report["errors"].values():
+                        log(val, logging.ERROR)
+
+            if not primary_submission_dict:
+                log("ENA generation failed.", logging.ERROR)
+            elif primary_submission_success:
+                log("ENA generation succeeded")
+            else:
+                log("ENA generation partially succeeded, resubmit the failed chunks",
+                    logging.WARNING)
 
-        if not primary_submission_success:
-            log("ENA generation failed.")
-            for val in primary_submission_dict.values():
-                log(val)
-        else:
-            log("ENA generation succeeded")
-            cobiont_biosample_dict = primary_submission_dict[cobiont_uuid]
+        # Output both newly accessioned cobionts and those from earlier runs
+        accessioned_samples_dict = {**done_samples_dict, **primary_submission_dict}
 
+        if accessioned_samples_dict:
             samples = []
 
-            for cobiont_biosample_dict in primary_submission_dict.values():
+            for cobiont_biosample_dict in accessioned_samples_dict.values():
                 samples.append(["cobiont", cobiont_biosample_dict["tolid"][0], cobiont_biosample_dict["biosample_accession"][0]])
-            
+        
             cols=['Type', 'ToLID', 'Biosample Accession']
-            
-            output_df = pd.DataFrame(samples, columns = cols)
+        
             log("Output biosamples")
-            output_df.to_csv(output_file_name,index=False)
+            with open(output_file_name, 'w', newline='') as output_file:
+                writer = csv.writer(output_file)
+                writer.writerow(cols)
+                writer.writerows(samples)
+
+        log(ena_datasource.biosample_cache_stats())
+    finally:
+        # Close the pooled session and the journal even when the run fails
+        ena_datasource.close()
+        if journal:
+            journal.close()
 
 
 if __name__ == "__main__":
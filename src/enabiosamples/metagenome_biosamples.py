@@ -8,19 +8,29 @@ It maintains compatibility with the original script's interface while using
 the new modular backend.
 """
 
+from __future__ import annotations
+
 import json
+import logging
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
 import click
-import polars as pl
-from ena_datasource import EnaDataSource
-from enabiosamples.HostAssocMetagenomeBiosampleGenerator import (
-    HostAssocMetagenomeBiosampleGenerator,
-)
+from enabiosamples.run_log import configure_run_logging
+
+# polars and the ENA client are imported where they are used, so that
+# --help and argument errors return without loading them
+if TYPE_CHECKING:
+    import polars as pl
+    from enabiosamples.HostAssocMetagenomeBiosampleGenerator import (
+        HostAssocMetagenomeBiosampleGenerator,
+    )
 
 
 def read_bin_csv(path: str) -> pl.DataFrame:
     """Validate that binned/MAG CSV has required columns."""
+    import polars as pl
 
     return pl.read_csv(
         path,
@@ -54,34 +64,190 @@ def read_bin_csv(path: str) -> pl.DataFrame:
     )
 
 
-def process_metagenomes(
-    primary_df: pl.DataFrame, generator: HostAssocMetagenomeBiosampleGenerator
+def row_journaled(
+    row: Dict[str, Any], generator: HostAssocMetagenomeBiosampleGenerator
 ) -> bool:
-    for row in primary_df.iter_rows(named=True):
-        binned_data_list = None
-        mag_data_list = None
-
-        if row["binned_path"]:
-            try:
-                binned_df = read_bin_csv(row["binned_path"])
-                binned_data_list = binned_df.to_dicts()
-            except Exception as e:
-                print(f"Error loading binned data: {e}")
-
-        if row["mag_path"]:
-            try:
-                mag_df = read_bin_csv(row["mag_path"])
-                mag_data_list = mag_df.to_dicts()
-            except Exception as e:
-                print(f"Error loading MAG data: {e}")
-
-        success, results = generator.generate_biosample_ids(
+    """Whether a previous run already accessioned the primary and every bin of row."""
+    import polars as pl
+
+    if generator.journal is None:
+        return False
+
+    # Only the names are needed to find the journal entries of the bins
+    bin_names = []
+    try:
+        for path in (row["binned_path"], row["mag_path"]):
+            if path:
+                bin_names += pl.read_csv(
+                    path,
+                    columns=["bin_name", "tol_id"],
+                    schema_overrides={"bin_name": pl.String, "tol_id": pl.String},
+                ).to_dicts()
+    except Exception:
+        # Reported when the row itself is processed
+        return False
+
+    return generator.journal_summary(row, bin_names) is not None
+
+
+def filter_valid_bins(
+    bin_df: pl.DataFrame,
+    generator: HostAssocMetagenomeBiosampleGenerator,
+    checklist: str,
+    path: str,
+) -> pl.DataFrame:
+    """Validate bins column-wise, log failing rows and keep the valid ones."""
+
+    valid_df, error_df = generator.validate_bin_frame(bin_df, checklist)
+
+    for error in error_df.iter_rows(named=True):
+        generator.log(
+            f"{path} row {error['row']}: {error['field']} is invalid "
+            f"({error['type']}): '{error['value']}'",
+            logging.WARNING,
+        )
+
+    if error_df.height:
+        generator.log(
+            f"{path}: {bin_df.height - valid_df.height} of {bin_df.height} "
+            "rows failed validation and will not be submitted",
+            logging.WARNING,
+        )
+
+    return valid_df
+
+
+def load_bin_data(
+    row: Dict[str, Any],
+    generator: HostAssocMetagenomeBiosampleGenerator,
+    columnar_validation: bool = False,
+) -> Tuple[Optional[List[Dict[str, Any]]], Optional[List[Dict[str, Any]]]]:
+    """Read the binned and MAG CSVs of one primary row."""
+    binned_data_list = None
+    mag_data_list = None
+
+    if row["binned_path"]:
+        try:
+            binned_df = read_bin_csv(row["binned_path"])
+            if columnar_validation:
+                binned_df = filter_valid_bins(
+                    binned_df, generator, "ERC000050", row["binned_path"]
+                )
+            binned_data_list = binned_df.to_dicts()
+        except Exception as e:
+            generator.log(f"Error loading binned data: {e}", logging.ERROR)
+
+    if row["mag_path"]:
+        try:
+            mag_df = read_bin_csv(row["mag_path"])
+            if columnar_validation:
+                mag_df = filter_valid_bins(
+                    mag_df, generator, "ERC000047", row["mag_path"]
+                )
+            mag_data_list = mag_df.to_dicts()
+        except Exception as e:
+            generator.log(f"Error loading MAG data: {e}", logging.ERROR)
+
+    return binned_data_list, mag_data_list
+
+
+def process_metagenome_row(
+    row: Dict[str, Any],
+    generator: HostAssocMetagenomeBiosampleGenerator,
+    columnar_validation: bool = False,
+) -> Tuple[bool, Dict[str, Any]]:
+    """Load one primary row's bins and MAGs, then submit the primary and its bins."""
+    try:
+        binned_data_list, mag_data_list = load_bin_data(
+            row, generator, columnar_validation
+        )
+
+        return generator.generate_biosample_ids(
             primary_data=row,
             binned_data_list=binned_data_list,
             mag_data_list=mag_data_list,
+            prevalidated=columnar_validation,
         )
+    except Exception as e:
+        # One failing row must not stop the others running alongside it
+        generator.log(
+            f"Error processing {row['metagenome_tolid']}: {e}", logging.ERROR
+        )
+        return False, {"error": str(e)}
+
 
-    return success, results
+def run_rows_concurrently(
+    rows: List[Dict[str, Any]],
+    generator: HostAssocMetagenomeBiosampleGenerator,
+    columnar_validation: bool,
+    workers: int,
+) -> List[Tuple[bool, Dict[str, Any]]]:
+    """Run process_metagenome_row over rows on a thread pool, in input order."""
+
+    def process_row(row: Dict[str, Any]) -> Tuple[bool, Dict[str, Any]]:
+        return process_metagenome_row(row, generator, columnar_validation)
+
+    if len(rows) <= 1 or workers <= 1:
+        row_results = [process_row(row) for row in rows]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            row_results = list(executor.map(process_row, rows))
+
+    return row_results
+
+
+def process_metagenomes(
+    primary_df: pl.DataFrame,
+    generator: HostAssocMetagenomeBiosampleGenerator,
+    columnar_validation: bool = False,
+    workers: Optional[int] = None,
+    batch: bool = False,
+) -> Tuple[bool, List[Dict[str, Any]]]:
+    """
+    Process every primary row, running up to ``workers`` rows at once.
+
+    Each row still submits its primary before its bins. With ``batch``,
+    the primaries of all rows are submitted together instead, then all
+    of their bins. Returns whether every row succeeded and the summary of
+    each row, in input order.
+    """
+    workers = workers or generator.ena_datasource.workers
+
+    rows = list(primary_df.iter_rows(named=True))
+
+    # Fetch each host once, however many primaries share it, except for
+    # rows a previous run already accessioned. A host that cannot be
+    # fetched is skipped here and fails only its own rows below.
+    generator.ena_datasource.prefetch_biosample_data(
+        row["host_biospecimen"] for row in rows if not row_journaled(row, generator)
+    )
+
+    if batch:
+        _, batch_results = generator.generate_biosample_ids_batch(
+            [(row, *load_bin_data(row, generator, columnar_validation)) for row in rows],
+            prevalidated=columnar_validation,
+        )
+        row_results = [
+            ("error" not in results, results) for results in batch_results
+        ]
+    else:
+        row_results = run_rows_concurrently(
+            rows, generator, columnar_validation, workers
+        )
+
+    for row, (success, results) in zip(rows, row_results):
+        if not success:
+            generator.log(
+                f"{row['metagenome_tolid']} failed: {results.get('error')}",
+                logging.ERROR,
+            )
+
+    generator.log(generator.ena_datasource.biosample_cache_stats())
+
+    return (
+        all(success for success, _ in row_results),
+        [results for _, results in row_results],
+    )
 
 
 @click.command()
@@ -112,9 +278,81 @@ def process_metagenomes(
     help="Path to log file",
     default="biosamples.log",
 )
+@click.option(
+    "-v",
+    "--verbosity",
+    type=click.Choice(["DEBUG", "INFO", "WARNING", "ERROR"], case_sensitive=False),
+    default="INFO",
+    help="Minimum level of messages written to the log file",
+)
+@click.option(
+    "--log-format",
+    type=click.Choice(["json", "text"]),
+    default="json",
+    help="Write the log as JSON lines or as plain text",
+)
+@click.option(
+    "--run-id",
+    type=str,
+    default=None,
+    help="Correlation ID stamped on every log line (generated if not given)",
+)
+@click.option(
+    "-j",
+    "--journal",
+    type=click.Path(),
+    default=None,
+    help="SQLite run journal; samples already accessioned in it are not resubmitted",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    default=None,
+    help="Number of primary rows processed concurrently (defaults to 'workers' in the credentials file)",
+)
+@click.option(
+    "--batch",
+    is_flag=True,
+    default=False,
+    help="Submit the primaries of all rows together, then all of their bins",
+)
+@click.option(
+    "--offline-checklists",
+    is_flag=True,
+    default=False,
+    help="Only use checklists from the local checklist cache",
+)
+@click.option(
+    "--columnar-validation",
+    is_flag=True,
+    default=False,
+    help="Validate bin/MAG CSVs column-wise and submit only the valid rows",
+)
 @click.argument("primary_csv", type=click.File("r"), required=True)
-def cli(api_credentials, project, primary_csv, output_file, log_file, debug):
+def cli(
+    api_credentials,
+    project,
+    primary_csv,
+    output_file,
+    log_file,
+    debug,
+    verbosity,
+    log_format,
+    run_id,
+    journal,
+    workers,
+    batch,
+    offline_checklists,
+    columnar_validation,
+):
     """Main function for command-line interface."""
+    import polars as pl
+    from ena_datasource import EnaDataSource
+    from enabiosamples.HostAssocMetagenomeBiosampleGenerator import (
+        HostAssocMetagenomeBiosampleGenerator,
+    )
+    from enabiosamples.run_journal import RunJournal
 
     try:
         credentials = json.load(api_credentials)["credentials"]
@@ -139,20 +377,47 @@ def cli(api_credentials, project, primary_csv, output_file, log_file, debug):
         },
     )
 
-    ena_datasource = EnaDataSource(config=credentials, debug=debug)
+    configure_run_logging(
+        log_file,
+        run_id=run_id,
+        verbosity=verbosity,
+        json_lines=log_format == "json",
+    )
+
+    ena_datasource = EnaDataSource(
+        config=credentials, debug=debug, offline_checklists=offline_checklists
+    )
+
+    run_journal = RunJournal(journal) if journal else None
 
     generator = HostAssocMetagenomeBiosampleGenerator(
-        ena_datasource=ena_datasource, project_name=project, log_file=log_file
+        ena_datasource=ena_datasource, project_name=project, journal=run_journal
     )
 
-    success, results = process_metagenomes(primary_df=primary_df, generator=generator)
-
-    ## Write biosamples to a TSV file
-    (
-        pl.DataFrame([results["primary"]] + results["magsbins"]).write_csv(
-            output_file, separator="\t"
+    try:
+        success, results = process_metagenomes(
+            primary_df=primary_df,
+            generator=generator,
+            columnar_validation=columnar_validation,
+            workers=workers,
+            batch=batch,
         )
-    )
+    finally:
+        ena_datasource.close()
+        if run_journal:
+            run_journal.close()
+
+    ## Write biosamples of every successful row to a TSV file
+    biosamples = [
+        biosample
+        for row_results in results
+        if "primary" in row_results
+        for biosample in [row_results["primary"]] + row_results["magsbins"]
+    ]
+    pl.DataFrame(biosamples).write_csv(output_file, separator="\t")
+
+    if not success:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
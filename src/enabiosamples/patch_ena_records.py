@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+import csv
+import optparse
+import datetime
+import json
+import logging
+import xml.etree.ElementTree as ElementTree
+from enabiosamples.attribute_patch import AttributePatch
+from enabiosamples.run_log import configure_run_logging, get_logger
+
+logger = get_logger("patch")
+
+def log(message, level=logging.INFO):
+    logger.log(level, message)
+
+def build_parser():
+    # Options shared by every script that patches existing records
+    parser = optparse.OptionParser()
+    parser.add_option('-a', '--api_credentials',
+                dest="api",
+                default="",
+                )
+    parser.add_option('-d', '--data_csv',
+                dest="data",
+                default="default.csv",
+                )
+    parser.add_option('-v', '--verbosity',
+                dest="verbosity",
+                default="INFO",
+                help="Minimum level of messages written to the log file",
+                )
+    parser.add_option('--log-format',
+                dest="log_format",
+                choices=["json", "text"],
+                default="json",
+                help="Write the log as JSON lines or as plain text",
+                )
+    parser.add_option('--no-verify',
+                dest="verify",
+                action="store_false",
+                default=True,
+                help="Do not re-fetch updated records to check the update was applied",
+                )
+    parser.add_option('-r', '--report',
+                dest="report",
+                default="update_report.tsv",
+                help="Per-record report of the changes made and their verification",
+                )
+    parser.add_option('--run-id',
+                dest="run_id",
+                default=None,
+                help="Correlation ID stamped on every log line",
+                )
+    return parser
+
+def write_update_report(report_file_name, ena_datasource, initial_attributes,
+                        modified_samples, results_data, mismatches):
+    # One line per record: what changed, whether it was applied
+    with open(report_file_name, 'w', newline='') as report_file:
+        writer = csv.writer(report_file, delimiter='\t')
+        writer.writerow(['accession', 'update', 'changes', 'verification'])
+
+        for biosampleid, result in results_data.items():
+            changes = []
+            if biosampleid in modified_samples:
+                changes = ena_datasource.diff_sample_attributes(
+                    initial_attributes[biosampleid],
+                    ena_datasource.sample_attributes(modified_samples[biosampleid]))
+
+            if biosampleid not in mismatches:
+                verification = "not checked"
+            elif mismatches[biosampleid] is None:
+                verification = "verification fetch failed"
+            elif mismatches[biosampleid]:
+                verification = "mismatch: " + "; ".join(
+                    f"{tag}: sent '{sent}', found '{found}'"
+                    for tag, sent, found in mismatches[biosampleid])
+                log(f"{biosampleid} {verification}", logging.WARNING)
+            else:
+                verification = "ok"
+
+            writer.writerow([
+                biosampleid,
+                result,
+                "; ".join(f"{tag}: '{before}' -> '{after}'" for tag, before, after in changes),
+                verification])
+
+def patch_records(ena_datasource, samples, patch, verify=True, report="update_report.tsv"):
+    """Fetch, patch, bulk update and verify the records of every CSV row."""
+    accessions = [sample[patch.key_column] for sample in samples]
+
+    # Fetch every existing record up front, concurrently, in input order.
+    # A record that cannot be fetched is reported as failed, the rest go on.
+    initial_samples_data = ena_datasource.get_existing_samples_data(
+        accessions,
+        on_error=lambda biosampleid, ex: log(
+            f"Fetch of {biosampleid} failed: {ex}", logging.ERROR))
+
+    modified_samples = {}
+    initial_attributes = {}
+    fetch_failed = {}
+    for biosampleid, intial_sample_data in zip(accessions, initial_samples_data):
+        if intial_sample_data is None:
+            fetch_failed[biosampleid] = "failed: record could not be fetched"
+            continue
+
+        try:
+            modified_samples[biosampleid] = ElementTree.fromstring(intial_sample_data)
+        except ElementTree.ParseError as ex:
+            log(f"Record of {biosampleid} could not be read: {ex}", logging.ERROR)
+            fetch_failed[biosampleid] = "failed: record could not be read"
+            continue
+
+        initial_attributes[biosampleid] = ena_datasource.sample_attributes(
+            modified_samples[biosampleid])
+
+    patch.apply_all(modified_samples, [
+        sample for sample in samples if sample[patch.key_column] in modified_samples])
+
+    for biosampleid, root in modified_samples.items():
+        ElementTree.indent(root)
+        log(ElementTree.tostring(root, encoding='unicode'), logging.DEBUG)
+
+    # Submit every modified record in a few bulk MODIFY submissions
+    all_success, results_data, chunk_reports = (
+        ena_datasource.update_existing_samples(modified_samples))
+
+    for report_chunk in chunk_reports:
+        for biosampleid, error in report_chunk["errors"].items():
+            log(f"{biosampleid} update {error}", logging.ERROR)
+
+    results_data.update(fetch_failed)
+
+    # Check the updates were applied, once every update has been submitted
+    mismatches = {}
+    if verify:
+        mismatches = ena_datasource.verify_updated_samples({
+            biosampleid: modified_samples[biosampleid]
+            for biosampleid, result in results_data.items() if result == "success"})
+
+    write_update_report(report, ena_datasource, initial_attributes,
+                        modified_samples, results_data, mismatches)
+
+    return results_data
+
+def run(options, patch, log_name):
+    # Imported here so --help does not load the ENA client
+    from ena_datasource import EnaDataSource
+
+    log_file = f'{log_name}_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}.txt'
+    configure_run_logging(log_file, run_id=options.run_id, verbosity=options.verbosity,
+                          json_lines=options.log_format == "json")
+
+    with open(options.api) as json_file:
+        enviromment_params = json.load(json_file)
+
+    # Check connection to local tol-sdk
+    ena_datasource = EnaDataSource(enviromment_params['credentials'])
+
+    # utf-8-sig drops the byte order mark of CSVs exported from Excel
+    with open(options.data, encoding='utf-8-sig', newline='') as csv_file:
+        samples = list(csv.DictReader(csv_file))
+
+    try:
+        results_data = patch_records(ena_datasource, samples, patch,
+                                     verify=options.verify, report=options.report)
+    finally:
+        ena_datasource.close()
+
+    for key, value in results_data.items():
+        print(key)
+        print(value)
+
+def main():
+
+    parser = build_parser()
+    parser.add_option('-s', '--spec',
+                dest="spec",
+                default="",
+                help="JSON patch spec, see AttributePatch",
+                )
+
+    (options, args) = parser.parse_args()
+
+    run(options, AttributePatch.from_file(options.spec), "patch")
+
+if __name__ == "__main__":
+    main()
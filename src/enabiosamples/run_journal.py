@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Namespace for deterministic sample UUIDs, so a rerun of the same input
+# produces the same titles and aliases instead of fresh uuid4s.
+SAMPLE_NAMESPACE = uuid.UUID("6c1c6a5e-1f0e-4d55-9a45-3c2f9c1d7b10")
+
+
+def stable_sample_uuid(project_name: str, *parts) -> str:
+    """Deterministic uuid for a sample, derived from project and identifying parts."""
+    name = "/".join(str(part) for part in (project_name, *parts))
+    return str(uuid.uuid5(SAMPLE_NAMESPACE, name))
+
+
+def title_alias(title: str) -> str:
+    """
+    ENA alias of a sample: the unique id its title starts with.
+
+    Titles are <unique id>-<project name>-<specimen_type> and the unique
+    id is a uuid, so the alias is the first five dash separated parts.
+    """
+    return "-".join(title.split("-")[:5])
+
+
+class RunJournal:
+    """
+    Durable SQLite record of every sample a run tries to accession.
+
+    Each sample is stored under its alias with its kind, ToLID, submission
+    state (pending, submitted or failed) and the accessions ENA returned,
+    so an interrupted run can be restarted and only resubmit what is
+    not accessioned yet.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS samples (
+                    alias TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    kind TEXT,
+                    tolid TEXT,
+                    state TEXT NOT NULL,
+                    biosample_accession TEXT,
+                    sra_accession TEXT,
+                    submission_accession TEXT,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def get(self, title: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            cursor = self._connection.execute(
+                "SELECT * FROM samples WHERE alias = ?", (title_alias(title),)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+
+            return dict(zip([column[0] for column in cursor.description], row))
+
+    def accessioned(self, title: str) -> Optional[Dict[str, str]]:
+        """Return the journal entry if the sample already has a biosample accession."""
+        entry = self.get(title)
+
+        if entry and entry["state"] == "submitted" and entry["biosample_accession"]:
+            return entry
+
+        return None
+
+    def unresolved(self, titles: Iterable[str]) -> List[str]:
+        """
+        Titles left pending or failed by an earlier run.
+
+        ENA may have accepted these even though the journal never saw the
+        receipt, e.g. after a crash or a lost response.
+        """
+        unresolved = []
+        for title in titles:
+            entry = self.get(title)
+            if entry and entry["state"] in ("pending", "failed"):
+                unresolved.append(title)
+
+        return unresolved
+
+    def split_accessioned(
+        self,
+        samples: Dict[str, Dict],
+        find_submitted: Optional[Callable[[List[str]], Dict]] = None,
+    ) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+        """
+        Split samples into those already accessioned and those still to submit.
+
+        Accessioned samples get their accessions filled in from the journal,
+        in the same shape EnaDataSource.generate_ena_ids_for_samples returns.
+        With find_submitted (EnaDataSource.find_submitted_aliases), samples
+        left unresolved by an earlier run are first looked up in ENA, and
+        those found are recorded as submitted instead of being resubmitted
+        under an alias ENA would reject as a duplicate.
+        """
+        if find_submitted is not None:
+            self._reconcile(samples, find_submitted)
+
+        done, todo = {}, {}
+
+        for title, sample in samples.items():
+            entry = self.accessioned(title)
+
+            if entry is None:
+                todo[title] = sample
+            else:
+                sample["biosample_accession"] = [entry["biosample_accession"], None]
+                sample["sra_accession"] = [entry["sra_accession"], None]
+                sample["submission_accession"] = [
+                    entry["submission_accession"],
+                    None,
+                ]
+                done[title] = sample
+
+        return done, todo
+
+    def _reconcile(
+        self, samples: Dict[str, Dict], find_submitted: Callable[[List[str]], Dict]
+    ) -> None:
+        unresolved = self.unresolved(samples)
+        if not unresolved:
+            return
+
+        recovered = {}
+        for title, accessions in find_submitted(unresolved).items():
+            if accessions and accessions["biosample_accession"][0]:
+                recovered[title] = {**samples[title], **accessions}
+
+        self.record_submitted(recovered)
+
+    def record_pending(self, samples: Dict[str, Dict], kind: str) -> None:
+        self._upsert(
+            [
+                (title, kind, sample.get("tolid", [None])[0], "pending", {})
+                for title, sample in samples.items()
+            ]
+        )
+
+    def record_submitted(self, samples: Dict[str, Dict]) -> None:
+        self._upsert(
+            [
+                (title, None, sample.get("tolid", [None])[0], "submitted", sample)
+                for title, sample in samples.items()
+            ]
+        )
+
+    def record_failed(self, titles: Iterable[str]) -> None:
+        self._upsert([(title, None, None, "failed", {}) for title in titles])
+
+    def _upsert(self, entries: List) -> None:
+        now = time.time()
+
+        rows = [
+            (
+                title_alias(title),
+                title,
+                kind,
+                tolid,
+                state,
+                sample.get("biosample_accession", [None])[0],
+                sample.get("sra_accession", [None])[0],
+                sample.get("submission_accession", [None])[0],
+                now,
+            )
+            for title, kind, tolid, state, sample in entries
+        ]
+
+        with self._lock, self._connection:
+            self._connection.executemany(
+                """INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(alias) DO UPDATE SET
+                    kind = COALESCE(excluded.kind, kind),
+                    tolid = COALESCE(excluded.tolid, tolid),
+                    state = excluded.state,
+                    biosample_accession = COALESCE(
+                        excluded.biosample_accession, biosample_accession
+                    ),
+                    sra_accession = COALESCE(excluded.sra_accession, sra_accession),
+                    submission_accession = COALESCE(
+                        excluded.submission_accession, submission_accession
+                    ),
+                    updated_at = excluded.updated_at""",
+                rows,
+            )
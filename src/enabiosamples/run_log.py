@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+import uuid
+from typing import Optional
+
+LOGGER_NAME = "enabiosamples"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """File handler that keeps the log open and flushes at most every interval.
+
+    logging.StreamHandler flushes after every record; here the stream's own
+    buffer is only flushed once ``flush_interval`` seconds have passed, by
+    the next record or by a timer if none arrives (and on close), so big
+    batches do not cost one write syscall per line and a quiet spell never
+    leaves lines unwritten. WARNING and above are flushed straight away.
+    """
+
+    def __init__(self, filename: str, flush_interval: float = 1.0):
+        super().__init__(filename, mode="a", encoding="utf-8", delay=True)
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        self._timer: Optional[threading.Timer] = None
+        self._closing = False
+
+    def emit(self, record: logging.LogRecord) -> None:
+        super().emit(record)
+        if record.levelno >= logging.WARNING:
+            self._flush_now()
+
+    def flush(self) -> None:
+        # Called by emit with the handler lock held
+        elapsed = time.monotonic() - self._last_flush
+        if elapsed >= self.flush_interval or self._closing:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = threading.Timer(
+                self.flush_interval - elapsed, self._timed_flush
+            )
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timed_flush(self) -> None:
+        with self.lock:
+            self._timer = None
+            self._flush_now()
+
+    def _flush_now(self) -> None:
+        super().flush()
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        with self.lock:
+            self._closing = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        super().close()
+
+
+class RunIdFilter(logging.Filter):
+    """Stamp every record with the correlation ID of the current run."""
+
+    def __init__(self, run_id: str):
+        super().__init__()
+        self.run_id = run_id
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.run_id = self.run_id
+        return True
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "run_id": getattr(record, "run_id", None),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Return a logger below the package logger configured by configure_run_logging."""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def configure_run_logging(
+    log_file: str,
+    run_id: Optional[str] = None,
+    verbosity: str = "INFO",
+    json_lines: bool = True,
+) -> str:
+    """
+    Route all package logging to log_file through a background thread.
+
+    Records are put on a queue by the calling thread and written by a
+    QueueListener into a BufferedFileHandler, either as JSON lines or in
+    the plain "(time) message" format. Every record carries ``run_id``.
+
+    Returns:
+        The run ID used, generated if not given.
+    """
+    global _listener
+
+    run_id = run_id or uuid.uuid4().hex[:12]
+
+    shutdown_run_logging()
+
+    file_handler = BufferedFileHandler(log_file)
+    if json_lines:
+        file_handler.setFormatter(JsonLinesFormatter())
+    else:
+        file_handler.setFormatter(
+            logging.Formatter("(%(asctime)s) %(message)s", "%Y-%m-%d %H:%M:%S")
+        )
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RunIdFilter(run_id))
+
+    logger = logging.getLogger(LOGGER_NAME)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(queue_handler)
+    logger.setLevel(verbosity.upper())
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler)
+    _listener.start()
+
+    return run_id
+
+
+def shutdown_run_logging() -> None:
+    """Stop the background writer and flush everything still buffered."""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown_run_logging)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional
+from urllib.parse import quote
+
+from enabiosamples.cache_files import default_cache_dir, read_json, write_json
+from enabiosamples.ena_transport import EnaTransport
+from enabiosamples.run_log import get_logger
+
+# Bump when the layout of the cache file changes, so a file written by an
+# older version is ignored rather than misread.
+TAXONOMY_CACHE_VERSION = 1
+
+ENA_TAXONOMY_URI = "https://www.ebi.ac.uk"
+
+
+class TaxonomyResolver:
+    """Batched, cached lookups against the ENA taxonomy REST API.
+
+    Resolves scientific names to taxIds and checks that taxIds exist.
+    Results are kept in memory and in one json file shared across runs,
+    including names and taxIds ENA does not know, which are kept for
+    ``negative_ttl`` seconds instead of ``ttl``. Each batch is deduplicated
+    and only the uncached entries are fetched, concurrently.
+    """
+
+    def __init__(
+        self,
+        transport: Optional[EnaTransport] = None,
+        uri: str = ENA_TAXONOMY_URI,
+        cache_dir: Optional[str] = None,
+        ttl: float = 30 * 24 * 60 * 60,
+        negative_ttl: float = 24 * 60 * 60,
+        workers: int = 4,
+    ):
+        self.transport = transport or EnaTransport()
+        self.uri = uri
+        self.cache_path = os.path.join(
+            os.path.expanduser(cache_dir or default_cache_dir()),
+            f"taxonomy.v{TAXONOMY_CACHE_VERSION}.json",
+        )
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.workers = workers
+        self.logger = get_logger("taxonomy")
+        self._entries: Optional[Dict[str, Dict]] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(
+        cls, config: Dict, transport: Optional[EnaTransport] = None
+    ) -> "TaxonomyResolver":
+        settings = config.get("taxonomy", {})
+
+        return cls(
+            transport=transport,
+            uri=settings.get("uri", config.get("uri", ENA_TAXONOMY_URI)),
+            cache_dir=settings.get("dir"),
+            ttl=settings.get("ttl", 30 * 24 * 60 * 60),
+            negative_ttl=settings.get("negative_ttl", 24 * 60 * 60),
+            workers=config.get("workers", 4),
+        )
+
+    def resolve_names(self, names: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Map each scientific name to its taxId, or None if ENA does not know it.
+
+        Names whose lookup failed are left out, so callers can tell an
+        unknown name from one that could not be checked.
+        """
+        return self._lookup("name", names, self._fetch_name)
+
+    def resolve_name(self, name: str) -> Optional[str]:
+        taxids = self.resolve_names([name])
+        if name not in taxids:
+            raise Exception(f"Cannot resolve species '{name}' with ENA taxonomy")
+
+        return taxids[name]
+
+    def check_taxids(self, taxids: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Map each taxId to its scientific name, or None if ENA does not know it.
+
+        As for resolve_names, taxIds whose lookup failed are left out.
+        """
+        return self._lookup(
+            "taxid", (str(taxid) for taxid in taxids), self._fetch_taxid
+        )
+
+    def _lookup(
+        self, kind: str, keys: Iterable[str], fetch: Callable[[str], Optional[str]]
+    ) -> Dict[str, Optional[str]]:
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        missing = []
+
+        with self._lock:
+            entries = self._load()
+            now = time.time()
+            for key in keys:
+                entry = entries.get(f"{kind}:{key}")
+                if entry is not None and now - entry["fetched_at"] <= (
+                    self.ttl if entry["value"] is not None else self.negative_ttl
+                ):
+                    found[key] = entry["value"]
+                else:
+                    missing.append(key)
+
+        if not missing:
+            return found
+
+        def fetch_entry(key: str):
+            try:
+                return key, fetch(key)
+            except Exception as ex:
+                self.logger.warning(
+                    f"Taxonomy lookup of {kind} '{key}' failed: {ex}"
+                )
+                return key, ex
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            fetched = list(executor.map(fetch_entry, missing))
+
+        with self._lock:
+            now = time.time()
+            for key, value in fetched:
+                if isinstance(value, Exception):
+                    continue
+                self._entries[f"{kind}:{key}"] = {"value": value, "fetched_at": now}
+                found[key] = value
+            self._save()
+
+        return found
+
+    def _fetch_name(self, name: str) -> Optional[str]:
+        response = self.transport.get(
+            self.uri + f"/ena/taxonomy/rest/scientific-name/{quote(name)}"
+        )
+        records = self._read_records(response)
+
+        return str(records[0]["taxId"]) if records else None
+
+    def _fetch_taxid(self, taxid: str) -> Optional[str]:
+        response = self.transport.get(
+            self.uri + f"/ena/taxonomy/rest/tax-id/{quote(taxid)}"
+        )
+        records = self._read_records(response)
+
+        return records[0]["scientificName"] if records else None
+
+    def _read_records(self, response) -> list:
+        # Unknown names and taxIds come back as a 404 or a well-formed empty
+        # result. Anything else unexpected (e.g. an HTML maintenance page)
+        # raises, so it is not cached as unknown.
+        if response.status_code == 404:
+            return []
+
+        if response.status_code != 200:
+            raise Exception(
+                f"Cannot connect to ENA (status code '{str(response.status_code)}')'"
+            )
+
+        try:
+            records = response.json()
+        except ValueError:
+            raise Exception("ENA taxonomy returned a response that is not JSON")
+
+        if isinstance(records, dict):
+            records = [records]
+        if not isinstance(records, list):
+            raise Exception(f"Unexpected ENA taxonomy response: {records!r}")
+
+        return records
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            self._entries = self._read()
+        return self._entries
+
+    def _read(self) -> Dict[str, Dict]:
+        return read_json(self.cache_path) or {}
+
+    def _save(self) -> None:
+        # Merge with entries other runs wrote meanwhile
+        write_json(self.cache_path, {**self._read(), **self._entries})
@@ -1,49 +1,111 @@
 import netrc
 import sys
-from jira import JIRA
+import threading
+from typing import TYPE_CHECKING, Dict, Tuple
 
-class tol_jira_auth:
+# jira is slow to import, so only load it once we authenticate
+if TYPE_CHECKING:
+    from jira import JIRA
+
+# One authenticated client per server and credentials for the whole process,
+# so every search, download and upload reuses its session and connections.
+# The pool and timeout settings of the instance that first connects apply.
+_clients: Dict[Tuple, "JIRA"] = {}
+_clients_lock = threading.Lock()
+
+class ToLJiraAuth:
 
     @property
-    def auth_jira(self):
-        return self._auth_jira
+    def auth_jira(self) -> "JIRA":
+        """Authenticated JIRA client, created on first use and then reused."""
+        key = (self.jira_path, self._method, self._username, self._password)
+
+        with _clients_lock:
+            if key not in _clients:
+                _clients[key] = self._connect()
+            return _clients[key]
 
     @property
     def jira_path(self):
         return self._jira_path
 
-    def __init__(self, username: str = "", password: str = ""):
+    def __init__(self, username: str = "", password: str = "",
+                 pool_maxsize: int = 10, timeout: float = 60.0, max_retries: int = 3):
         """Class to authenticate access to JIRA and return JIRA object.
-        Attempts three different methods depending on parameters provided."""
+        Attempts three different methods depending on parameters provided.
+
+        Nothing is contacted until auth_jira is first used. pool_maxsize is
+        the number of connections kept open to JIRA, which should be at
+        least the number of threads sharing the client."""
 
         self._jira_path = "jira.sanger.ac.uk"
+        self._username = username
+        self._password = password
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.max_retries = max_retries
 
         # Attempt method, based on provided parameters
         if not (username or password):
-            self.authorise_netrc_token()
+            self._method = "netrc"
         elif username and password:
-            self.authorise_login(username, password)
+            self._method = "login"
         elif password:
-            self.authorise_token(password)
+            self._method = "token"
         else:
             print(f"No suitable credentials provided for access.")
             sys.exit(1)
 
-    def authorise_login(self, username: str, password: str) -> JIRA:
+    def _connect(self) -> "JIRA":
+        from requests import Session
+        from requests.adapters import HTTPAdapter
+
+        if self._method == "netrc":
+            jira = self.authorise_netrc_token()
+        elif self._method == "login":
+            jira = self.authorise_login(self._username, self._password)
+        else:
+            jira = self.authorise_token(self._password)
+
+        # Keep enough connections alive for every thread sharing the client.
+        # jira has no public way to size its connection pool, so the adapter
+        # is mounted on its session, as laid out in the jira 3.x releases
+        # pinned in pyproject.toml.
+        session = getattr(jira, "_session", None)
+        if not isinstance(session, Session):
+            raise RuntimeError(
+                "Cannot size the Jira connection pool: this jira release has no "
+                "requests session at JIRA._session, install jira>=3.8,<4")
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        return jira
+
+    def _options(self) -> Dict:
+        return {'server': "https://" + self.jira_path}
+
+    def authorise_login(self, username: str, password: str) -> "JIRA":
         """Attempt JIRA authentication using username and password."""
+        from jira import JIRA
 
         print(f"""Attempting to authenticate access to {self.jira_path} using
               provided username and password.""")
-        return JIRA({'server': "https://" + self.jira_path}, basic_auth=(username, password))
+        return JIRA(self._options(), basic_auth=(username, password),
+                    timeout=self.timeout, max_retries=self.max_retries)
 
-    def authorise_token(self, password: str) -> JIRA:
+    def authorise_token(self, password: str) -> "JIRA":
         """Attempt JIRA authentication using provided personal access token."""
+        from jira import JIRA
 
         print(f"Attempting to authenticate access to {self.jira_path} using provided token.")
-        return JIRA({'server': "https://" + self.jira_path}, token_auth=password)
+        return JIRA(self._options(), token_auth=password,
+                    timeout=self.timeout, max_retries=self.max_retries)
 
-    def authorise_netrc_token(self) -> JIRA:
+    def authorise_netrc_token(self) -> "JIRA":
         """Attempt JIRA authentication using personal access token stored in users .netrc."""
+        from jira import JIRA
         my_netrc = netrc.netrc()
 
         print(f"""Attempting to read Personal Access Token for specified host
@@ -51,4 +113,8 @@ class tol_jira_auth:
         jira_password = my_netrc.authenticators(self.jira_path)[2]
 
         print(f"Attempting to authenticate access to {self.jira_path} using .netrc token.")
-        return JIRA({'server': "https://" + self.jira_path}, token_auth=jira_password)
+        return JIRA(self._options(), token_auth=jira_password,
+                    timeout=self.timeout, max_retries=self.max_retries)
+
+# Former name of the class
+tol_jira_auth = ToLJiraAuth